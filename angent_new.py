@@ -1,10 +1,14 @@
+import asyncio
 import os
+import threading
 import uuid
-from typing import Literal
+from typing import AsyncIterator, Awaitable, Callable, Iterator, Literal
 from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
-from langgraph.checkpoint.memory import MemorySaver
+from langchain_core.runnables import RunnableLambda
 from langgraph.graph import END, START, StateGraph
 from assistants.common import State
+from assistants.router import fast_route, fast_route_target
+from db.checkpointer import create_checkpointer
 from assistants.subgraph_factory import create_specialized_subgraph
 from assistants.primary import (
     primary_assistant_tools,
@@ -36,13 +40,17 @@ from assistants.excursion import (
     route_book_excursion,
 )
 from tools.flight_tools import fetch_user_flight_information
-from tools.utilities_tools import create_tool_node_with_fallback
+from tools.utilities_tools import create_parallel_tool_node
 
 
 def user_info(state: State):
     return {"user_info": fetch_user_flight_information.invoke({})}
 
 
+async def auser_info(state: State):
+    return {"user_info": await fetch_user_flight_information.ainvoke({})}
+
+
 def get_user_id():
     """获取测试用户ID，实际应用中可以通过登录系统获取"""
     # 这里使用一个示例ID
@@ -67,10 +75,15 @@ def pop_dialog_state(state: State) -> dict:
 
 # Each delegated workflow can directly respond to the user
 # When the user responds, we want to return to the currently active workflow
+# 关键词快速路由：明确的委派请求跳过主助手的一次 LLM 调用
+FAST_ROUTE_ENABLED = os.environ.get("FAST_ROUTE_ENABLED", "1") != "0"
+
+
 def route_to_workflow(
     state: State,
 ) -> Literal[
     "primary_assistant",
+    "fast_route",
     "update_flight",
     "book_car_rental",
     "book_hotel",
@@ -79,32 +92,45 @@ def route_to_workflow(
     """If we are in a delegated state, route directly to the appropriate assistant."""
     dialog_state = state.get("dialog_state")
     if not dialog_state:
+        if FAST_ROUTE_ENABLED and fast_route_target(state):
+            return "fast_route"
         return "primary_assistant"
     return dialog_state[-1]
 
 
-def create_agent(passenger_id: str) -> StateGraph:
+def create_llm():
     from langchain_openai import ChatOpenAI
 
-    llm = ChatOpenAI(
+    return ChatOpenAI(
         base_url=os.environ.get("MODEL_BASE_URL"),
         api_key=os.environ.get("OPENAI_API_KEY"),
         model="gpt-3.5-turbo",
         temperature=1,
         streaming=True,
+        # 流式输出时也返回 usage，供 Assistant 统计 token
+        stream_usage=True,
     )
 
+
+def build_graph(llm=None, checkpointer=None):
+    """构建并编译对话图；图本身不包含任何乘客相关的状态"""
+    if llm is None:
+        llm = create_llm()
+    if checkpointer is None:
+        checkpointer = create_checkpointer()
+
     builder = StateGraph(State)
 
     # 添加基础节点
-    builder.add_node("fetch_user_info", user_info)
+    builder.add_node("fetch_user_info", RunnableLambda(user_info, afunc=auser_info))
 
     # Primary assistant
     builder.add_node("primary_assistant", create_primary_assistant(llm))
     builder.add_node(
         "primary_assistant_tools",
-        create_tool_node_with_fallback(primary_assistant_tools),
+        create_parallel_tool_node(primary_assistant_tools),
     )
+    builder.add_node("fast_route", fast_route)
     # 添加退出节点
     builder.add_node("leave_skill", pop_dialog_state)
 
@@ -170,11 +196,22 @@ def create_agent(passenger_id: str) -> StateGraph:
             END,
         ],
     )
+    builder.add_conditional_edges(
+        "fast_route",
+        route_primary_assistant,
+        [
+            "enter_update_flight",
+            "enter_book_car_rental",
+            "enter_book_hotel",
+            "enter_book_excursion",
+            "primary_assistant_tools",
+            END,
+        ],
+    )
     builder.add_edge("primary_assistant_tools", "primary_assistant")
 
-    memory = MemorySaver()
     graph = builder.compile(
-        checkpointer=memory,
+        checkpointer=checkpointer,
         interrupt_before=[
             "update_flight_sensitive_tools",
             "book_car_rental_sensitive_tools",
@@ -182,13 +219,39 @@ def create_agent(passenger_id: str) -> StateGraph:
             "book_excursion_sensitive_tools",
         ],
     )
-    graph = graph.with_config(
-        configurable={
+    return graph
+
+
+_graph = None
+_graph_pid = None
+_graph_lock = threading.Lock()
+
+
+def get_compiled_graph():
+    """返回进程内共享的已编译图，首次调用时构建"""
+    global _graph, _graph_pid
+    pid = os.getpid()
+    if _graph is not None and _graph_pid == pid:
+        return _graph
+    with _graph_lock:
+        if _graph is None or _graph_pid != pid:
+            _graph, _graph_pid = build_graph(), pid
+    return _graph
+
+
+def make_config(passenger_id: str, thread_id: str | None = None) -> dict:
+    """每次调用图时传入的会话配置"""
+    return {
+        "configurable": {
             "passenger_id": passenger_id,
-            "thread_id": str(uuid.uuid4()),
+            "thread_id": thread_id or str(uuid.uuid4()),
         }
-    )
-    return graph
+    }
+
+
+def create_agent(passenger_id: str):
+    """兼容旧接口：共享图绑定到该乘客的一个新会话"""
+    return get_compiled_graph().with_config(make_config(passenger_id))
 
 
 def _print_event(event, printed):
@@ -210,38 +273,126 @@ def _print_event(event, printed):
             printed.add(key)
 
 
-def process_message(
-    agent, message: str, chat_history: list[BaseMessage] = None
-) -> dict[str, any]:
-    """处理用户消息并返回机器人回复"""
-    if chat_history is None:
-        chat_history = []
+# 直接向用户输出文本的助手节点，只转发这些节点的 token
+ASSISTANT_NODES = {
+    "primary_assistant",
+    "update_flight",
+    "book_car_rental",
+    "book_hotel",
+    "book_excursion",
+}
+
+
+def _stream_tokens(agent, payload, config, printed: set) -> Iterator[tuple[str, str]]:
+    """运行图并在 token 到达时立即产出 (message_id, token)"""
+    for mode, chunk in agent.stream(payload, config, stream_mode=["messages", "updates"]):
+        token = _assistant_token(mode, chunk, printed)
+        if token:
+            yield token
+
+
+async def _astream_tokens(agent, payload, config, printed: set) -> AsyncIterator[tuple[str, str]]:
+    """`_stream_tokens` 的异步版本"""
+    async for mode, chunk in agent.astream(payload, config, stream_mode=["messages", "updates"]):
+        token = _assistant_token(mode, chunk, printed)
+        if token:
+            yield token
+
+
+def _assistant_token(mode: str, chunk, printed: set) -> tuple[str, str] | None:
+    if mode == "updates":
+        _print_event(chunk, printed)
+        return None
+    message, metadata = chunk
+    if metadata.get("langgraph_node") not in ASSISTANT_NODES:
+        return None
+    if isinstance(message, AIMessage) and isinstance(message.content, str) and message.content:
+        return message.id, message.content
+    return None
+
+
+def _build_messages(
+    message: str, chat_history: list[BaseMessage], has_state: bool = False
+) -> list[BaseMessage]:
+    # 线程已有 checkpoint 时历史已在状态中，只发送新消息，避免重复累积
     messages = []
-    for msg in chat_history:
+    for msg in [] if has_state else chat_history:
         if isinstance(msg, (HumanMessage, AIMessage)):
             messages.append(msg)
     messages.append(HumanMessage(content=message))
+    return messages
+
+
+def _rejection(snapshot, user_input: str) -> dict:
+    return {
+        "messages": [
+            ToolMessage(
+                tool_call_id=snapshot.values["messages"][-1].tool_calls[0]["id"],
+                content=f"API调用被用户拒绝。原因: '{user_input}'。请继续协助，考虑用户的输入。",
+            )
+        ]
+    }
+
+
+APPROVAL_PROMPT = "您是否批准上述操作？输入'y'继续；否则，请解释您要求的更改。\n\n"
+
+
+class _Relay:
+    """把多次图运行产出的 token 拼成一条回复，消息之间插入空行"""
+
+    def __init__(self):
+        self.chunks = []
+        self._last_message_id = None
+
+    def feed(self, message_id: str, token: str) -> Iterator[str]:
+        if self.chunks and message_id != self._last_message_id:
+            self.chunks.append("\n\n")
+            yield "\n\n"
+        self._last_message_id = message_id
+        self.chunks.append(token)
+        yield token
+
+    @property
+    def text(self) -> str:
+        return "".join(self.chunks)
+
+
+def process_message(
+    agent,
+    message: str,
+    chat_history: list[BaseMessage] = None,
+    config: dict | None = None,
+) -> Iterator[str]:
+    """处理用户消息，以流式方式逐 token 返回机器人回复
+
+    `config` 通常来自 `make_config`；省略时使用 `agent` 自身绑定的配置。
+    """
+    if chat_history is None:
+        chat_history = []
+    config = config or agent.config
+    has_state = bool(agent.get_state(config).values.get("messages"))
+    messages = _build_messages(message, chat_history, has_state)
 
     print("\n=== 开始处理新消息 ===")
     print(f"用户输入: {message}")
 
     # 用于跟踪已打印的事件
     _printed = set()
-    response_chunks = []
+    relay = _Relay()
+
+    def run(payload):
+        for message_id, token in _stream_tokens(agent, payload, config, _printed):
+            yield from relay.feed(message_id, token)
 
     print("\n=== 开始流式处理 ===")
-    events = list(agent.stream({"messages": messages}))
-    print(f"获取到 {len(events)} 个事件")
+    yield from run({"messages": messages})
 
-    config = agent.config
     snapshot = agent.get_state(config)
     while snapshot.next:
         # 我们有一个中断！智能体正在尝试使用工具，用户可以批准或拒绝
         print("\n=== 检测到工具调用中断点 ===")
         try:
-            user_input = input(
-                "您是否批准上述操作？输入'y'继续；否则，请解释您要求的更改。\n\n"
-            )
+            user_input = input(APPROVAL_PROMPT)
         except:
             user_input = "y"
 
@@ -249,60 +400,76 @@ def process_message(
 
         if user_input.strip() == "y":
             print("继续执行工具调用...")
-            result = list(agent.stream(None))
+            yield from run(None)
         else:
             print(f"拒绝原因: {user_input}")
             print("重新规划执行...")
-            result = list(
-                agent.stream(
-                    {
-                        "messages": [
-                            ToolMessage(
-                                tool_call_id=events["messages"][-1].tool_calls[0]["id"],
-                                content=f"API调用被用户拒绝。原因: '{user_input}'。请继续协助，考虑用户的输入。",
-                            )
-                        ]
-                    },
-                )
-            )
-
-        # 更新事件列表
-        if result:
-            print("\n=== 工具调用结果 ===")
-            events.extend(result)
+            yield from run(_rejection(snapshot, user_input))
 
         snapshot = agent.get_state(config)
 
-    print("\n=== 处理所有事件 ===")
-    for event in events:
-        if isinstance(event, dict) and "assistant" in event:
-            assistant_message = event["assistant"].get("messages")
-            if isinstance(assistant_message, AIMessage) and assistant_message.content:
-                chunk = assistant_message.content
-                response_chunks.append(chunk)
-                yield chunk
-
-        # 打印事件
-        _print_event(event, _printed)
-
     print("\n=== 完成消息处理 ===")
-    # 合并完整响应用于历史记录
-    full_response = "".join(response_chunks)
-
     # 更新对话历史
     chat_history.append(HumanMessage(content=message))
-    chat_history.append(AIMessage(content=full_response))
+    chat_history.append(AIMessage(content=relay.text))
 
     return None
 
 
+async def _prompt_approval(snapshot) -> str:
+    try:
+        return await asyncio.to_thread(input, APPROVAL_PROMPT)
+    except:
+        return "y"
+
+
+async def aprocess_message(
+    agent,
+    message: str,
+    chat_history: list[BaseMessage] = None,
+    approve: Callable[[object], Awaitable[str]] = _prompt_approval,
+    config: dict | None = None,
+) -> AsyncIterator[str]:
+    """`process_message` 的异步版本，适合在一个进程内并发服务多位乘客。
+
+    `approve` 接收中断时的图快照，返回 'y' 表示批准，否则返回拒绝原因。
+    """
+    if chat_history is None:
+        chat_history = []
+    config = config or agent.config
+    has_state = bool((await agent.aget_state(config)).values.get("messages"))
+    messages = _build_messages(message, chat_history, has_state)
+    _printed = set()
+    relay = _Relay()
+
+    async def run(payload):
+        async for message_id, token in _astream_tokens(agent, payload, config, _printed):
+            for piece in relay.feed(message_id, token):
+                yield piece
+
+    async for piece in run({"messages": messages}):
+        yield piece
+
+    snapshot = await agent.aget_state(config)
+    while snapshot.next:
+        user_input = await approve(snapshot)
+        payload = None if user_input.strip() == "y" else _rejection(snapshot, user_input)
+        async for piece in run(payload):
+            yield piece
+        snapshot = await agent.aget_state(config)
+
+    chat_history.append(HumanMessage(content=message))
+    chat_history.append(AIMessage(content=relay.text))
+
+
 def chat_loop():
     """简单的命令行聊天界面"""
     passenger_id = get_user_id()
     print(f"当前用户ID: {passenger_id}")
 
-    # 创建智能体
-    agent = create_agent(passenger_id)
+    # 共享的已编译图 + 本次会话的配置
+    agent = get_compiled_graph()
+    config = make_config(passenger_id)
 
     chat_history = []
     print("客户支持机器人已启动（LangGraph版本）。输入'退出'结束对话。")
@@ -318,7 +485,7 @@ def chat_loop():
         response_chunks = []
 
         # 收集流式响应
-        for chunk in process_message(agent, user_input, chat_history):
+        for chunk in process_message(agent, user_input, chat_history, config):
             print(chunk, end="", flush=True)
             response_chunks.append(chunk)
         print()  # 换行
@@ -336,7 +503,7 @@ def main():
 if __name__ == "__main__":
     # main()
 
-    agent = create_agent(get_user_id())
+    agent = get_compiled_graph()
     # 生成图表并保存为文件
     graph_png = agent.get_graph(xray=True).draw_mermaid_png()
 
@@ -1,7 +1,21 @@
-from typing import Any
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+from langchain_core.messages import AIMessage
 from langchain_core.runnables import Runnable, RunnableConfig
 from pydantic import BaseModel
 
+from assistants.compaction import DEFAULT_BUDGET, CompactionBudget, compact_messages
+
+logger = logging.getLogger(__name__)
+
+FALLBACK_RESPONSE = (
+    "Sorry, I wasn't able to come up with a response just now. "
+    "Could you rephrase your request or try again?"
+)
+
 class CompleteOrEscalate(BaseModel):
     """A tool to mark the current task as completed and/or to escalate control of the dialog to the main assistant,
     who can re-route the dialog based on the user's needs."""
@@ -25,20 +39,122 @@ class CompleteOrEscalate(BaseModel):
             },
         }
 
-class Assistant:
-    def __init__(self, runnable: Runnable):
+@dataclass
+class RetryPolicy:
+    """How often an empty LLM response is retried before falling back."""
+
+    max_attempts: int = 3
+    # 第 n 次重试前等待 backoff * 2**(n-1) 秒，上限 max_backoff
+    backoff: float = 0.5
+    max_backoff: float = 4.0
+
+    def delay(self, attempt: int) -> float:
+        return min(self.backoff * 2 ** (attempt - 1), self.max_backoff)
+
+
+@dataclass
+class CallMetrics:
+    """Accounting for one assistant step, summed over all attempts."""
+
+    attempts: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    wall_time: float = 0.0
+    fallback: bool = False
+
+    def record(self, result) -> None:
+        self.attempts += 1
+        usage = getattr(result, "usage_metadata", None) or {}
+        self.input_tokens += usage.get("input_tokens", 0)
+        self.output_tokens += usage.get("output_tokens", 0)
+
+
+class Assistant(Runnable):
+    """Graph node that calls the LLM runnable, re-prompting on empty output.
+
+    Implements both `invoke` and `ainvoke`, so the same node runs natively
+    under `graph.stream` and `graph.astream`. The LLM sees a compacted view of
+    the history that fits `budget`; the checkpointed state is left untouched.
+    Empty responses are retried per `retry`, after which a fallback message
+    is returned. Each step's `CallMetrics` is logged, stored on
+    `last_metrics` and passed to `on_metrics` if given.
+    """
+
+    def __init__(
+        self,
+        runnable: Runnable,
+        budget: CompactionBudget = DEFAULT_BUDGET,
+        retry: Optional[RetryPolicy] = None,
+        on_metrics: Optional[Callable[[CallMetrics], None]] = None,
+    ):
         self.runnable = runnable
+        self.budget = budget
+        self.retry = retry or RetryPolicy()
+        self.on_metrics = on_metrics
+        self.last_metrics: Optional[CallMetrics] = None
 
-    def __call__(self, state: Any, config: RunnableConfig):
+    def _compact(self, state: Any) -> Any:
+        return {**state, "messages": compact_messages(state["messages"], self.budget)}
+
+    @staticmethod
+    def _is_empty(result) -> bool:
+        return not result.tool_calls and (
+            not result.content
+            or isinstance(result.content, list)
+            and not result.content[0].get("text")
+        )
+
+    @staticmethod
+    def _reprompt(state: Any) -> Any:
+        messages = state["messages"] + [("user", "Respond with a real output.")]
+        return {**state, "messages": messages}
+
+    def _finish(self, result, metrics: CallMetrics, started: float) -> dict:
+        if self._is_empty(result):
+            metrics.fallback = True
+            result = AIMessage(content=FALLBACK_RESPONSE)
+            logger.warning(
+                "LLM returned empty output %d times; using fallback response",
+                metrics.attempts,
+            )
+        metrics.wall_time = time.perf_counter() - started
+        logger.info(
+            "assistant step: attempts=%d input_tokens=%d output_tokens=%d wall_time=%.3fs",
+            metrics.attempts,
+            metrics.input_tokens,
+            metrics.output_tokens,
+            metrics.wall_time,
+        )
+        self.last_metrics = metrics
+        if self.on_metrics is not None:
+            self.on_metrics(metrics)
+        return {"messages": result}
+
+    def invoke(self, state: Any, config: Optional[RunnableConfig] = None, **kwargs):
+        started = time.perf_counter()
+        metrics = CallMetrics()
+        state = self._compact(state)
         while True:
-            result = self.runnable.invoke(state)
-            if not result.tool_calls and (
-                not result.content
-                or isinstance(result.content, list)
-                and not result.content[0].get("text")
-            ):
-                messages = state["messages"] + [("user", "Respond with a real output.")]
-                state = {**state, "messages": messages}
-            else:
+            result = self.runnable.invoke(state, config)
+            metrics.record(result)
+            if not self._is_empty(result) or metrics.attempts >= self.retry.max_attempts:
                 break
-        return {"messages": result}
\ No newline at end of file
+            time.sleep(self.retry.delay(metrics.attempts))
+            state = self._reprompt(state)
+        return self._finish(result, metrics, started)
+
+    async def ainvoke(self, state: Any, config: Optional[RunnableConfig] = None, **kwargs):
+        started = time.perf_counter()
+        metrics = CallMetrics()
+        state = self._compact(state)
+        while True:
+            result = await self.runnable.ainvoke(state, config)
+            metrics.record(result)
+            if not self._is_empty(result) or metrics.attempts >= self.retry.max_attempts:
+                break
+            await asyncio.sleep(self.retry.delay(metrics.attempts))
+            state = self._reprompt(state)
+        return self._finish(result, metrics, started)
+
+    def __call__(self, state: Any, config: RunnableConfig):
+        return self.invoke(state, config)
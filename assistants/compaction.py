@@ -0,0 +1,132 @@
+from dataclasses import dataclass
+
+from langchain_core.messages import (
+    AIMessage,
+    BaseMessage,
+    HumanMessage,
+    SystemMessage,
+    ToolMessage,
+)
+
+
+@dataclass
+class CompactionBudget:
+    """Per-assistant limits on how much history is sent to the LLM."""
+
+    # 对话消息（不含系统提示）的估算 token 上限
+    max_tokens: int = 6000
+    # 最近的用户轮次数（含当前轮），这些轮次的工具输出按 max_current_tool_chars 截短
+    keep_recent_turns: int = 3
+    # 更早轮次中工具输出的最大字符数
+    max_tool_chars: int = 1500
+    # 最近轮次中工具输出的最大字符数
+    max_current_tool_chars: int = 8000
+    # 早期对话摘要的最大字符数
+    summary_chars: int = 1500
+
+
+DEFAULT_BUDGET = CompactionBudget()
+
+
+def _text(message: BaseMessage) -> str:
+    content = message.content
+    if isinstance(content, str):
+        return content
+    return " ".join(
+        part.get("text", "") if isinstance(part, dict) else str(part) for part in content
+    )
+
+
+def estimate_tokens(messages: list[BaseMessage]) -> int:
+    """Cheap token estimate (~4 chars per token) used for budgeting."""
+    total = 0
+    for message in messages:
+        total += len(_text(message)) // 4 + 4
+        for tool_call in getattr(message, "tool_calls", None) or []:
+            total += len(str(tool_call.get("args", ""))) // 4 + 8
+    return total
+
+
+def _truncate_tool_output(message: BaseMessage, limit: int) -> BaseMessage:
+    if not isinstance(message, ToolMessage) or not isinstance(message.content, str):
+        return message
+    if len(message.content) <= limit:
+        return message
+    dropped = len(message.content) - limit
+    return message.model_copy(
+        update={"content": f"{message.content[:limit]}\n... [truncated {dropped} chars]"}
+    )
+
+
+def _split_turns(messages: list[BaseMessage]) -> list[list[BaseMessage]]:
+    """Group messages into turns, each starting at a user message."""
+    turns: list[list[BaseMessage]] = []
+    for message in messages:
+        if isinstance(message, HumanMessage) or not turns:
+            turns.append([])
+        turns[-1].append(message)
+    return turns
+
+
+def _summarize_turn(turn: list[BaseMessage]) -> list[str]:
+    lines = []
+    for message in turn:
+        if isinstance(message, HumanMessage):
+            lines.append(f"User: {_text(message)[:200]}")
+        elif isinstance(message, AIMessage):
+            for tool_call in message.tool_calls:
+                lines.append(f"Called {tool_call['name']}({tool_call.get('args', {})})")
+            if _text(message):
+                lines.append(f"Assistant: {_text(message)[:200]}")
+        elif isinstance(message, ToolMessage):
+            # 保留结果开头（列名和前几行的 ID），之后的轮次还可能引用
+            lines.append(f"Result of {message.name or 'tool'}: {_text(message)[:200]}")
+    return lines
+
+
+def _summary_message(turns: list[list[BaseMessage]], limit: int) -> SystemMessage:
+    lines = [line for turn in turns for line in _summarize_turn(turn)]
+    summary = "\n".join(lines)
+    if len(summary) > limit:
+        # 摘要超长时保留最近的部分
+        summary = "...\n" + summary[-limit:]
+    return SystemMessage(
+        content="Summary of the earlier conversation (older messages omitted):\n" + summary
+    )
+
+
+def compact_messages(
+    messages: list[BaseMessage], budget: CompactionBudget = DEFAULT_BUDGET
+) -> list[BaseMessage]:
+    """Return a view of `messages` that fits `budget`.
+
+    Tool outputs are truncated (harder outside the `keep_recent_turns` most
+    recent turns). Only while the history is still over budget are the
+    oldest turns replaced by a short extractive summary; a history that fits
+    is kept as is. Turns are only dropped whole, so every tool call keeps its
+    tool result.
+    """
+    turns = _split_turns(messages)
+    if not turns:
+        return list(messages)
+    recent_start = len(turns) - max(budget.keep_recent_turns, 1)
+    turns = [
+        [
+            _truncate_tool_output(
+                m, budget.max_current_tool_chars if i >= recent_start else budget.max_tool_chars
+            )
+            for m in turn
+        ]
+        for i, turn in enumerate(turns)
+    ]
+    *kept, current = turns
+
+    dropped = []
+    # 超预算时才从最早的轮次开始并入摘要，直到剩余部分放得下
+    while kept and estimate_tokens([m for turn in kept for m in turn] + current) > budget.max_tokens:
+        dropped.append(kept.pop(0))
+
+    compacted = [m for turn in kept for m in turn] + current
+    if dropped:
+        compacted.insert(0, _summary_message(dropped, budget.summary_chars))
+    return compacted
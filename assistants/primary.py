@@ -7,6 +7,7 @@ from tools.flight_tools import search_flights
 from langgraph.graph import END
 from langchain_core.runnables import Runnable
 from assistants.base import Assistant
+from assistants.compaction import CompactionBudget
 from assistants.common import State
 from langgraph.prebuilt import tools_condition
 
@@ -135,7 +136,11 @@ def route_primary_assistant(
         return "primary_assistant_tools"
     raise ValueError("Invalid route")
 
-def create_primary_assistant(llm: Runnable,):
+# 主助手只负责路由，不需要长段工具输出
+PRIMARY_BUDGET = CompactionBudget(max_tokens=4000, max_current_tool_chars=4000)
+
+
+def create_primary_assistant(llm: Runnable, budget: CompactionBudget = PRIMARY_BUDGET):
     """创建主助手"""
     assistant_runnable = primary_assistant_prompt | llm.bind_tools(
         [
@@ -146,4 +151,4 @@ def create_primary_assistant(llm: Runnable,):
         ]
         + primary_assistant_tools
     )
-    return Assistant(assistant_runnable)
\ No newline at end of file
+    return Assistant(assistant_runnable, budget)
\ No newline at end of file
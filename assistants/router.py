@@ -0,0 +1,183 @@
+import re
+import uuid
+from typing import Optional
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from assistants.common import State
+from assistants.primary import (
+    ToBookCarRental,
+    ToBookExcursion,
+    ToFlightBookingAssistant,
+    ToHotelBookingAssistant,
+)
+
+
+def _rule(actions: str, subjects: str) -> re.Pattern:
+    # 动作词与对象词在同一句中出现（顺序不限）
+    return re.compile(
+        rf"(\b(?:{actions})\b.*\b(?:{subjects})\b)|(\b(?:{subjects})\b.*\b(?:{actions})\b)",
+        re.IGNORECASE | re.DOTALL,
+    )
+
+
+# 各专门助手负责的对象；一句话提到多个助手的对象时交给 LLM
+INTENT_SUBJECTS: dict[str, re.Pattern] = {
+    ToFlightBookingAssistant.__name__: re.compile(r"\b(?:flights?|tickets?)\b|航班|机票", re.IGNORECASE),
+    ToHotelBookingAssistant.__name__: re.compile(r"\b(?:hotels?|lodging)\b|酒店|住宿", re.IGNORECASE),
+    ToBookCarRental.__name__: re.compile(r"\bcars?\b|租车|汽车", re.IGNORECASE),
+    ToBookExcursion.__name__: re.compile(
+        r"\b(?:excursions?|tours?|trips?|activit(?:y|ies)|museums?|sightseeing)\b|游览|景点|行程",
+        re.IGNORECASE,
+    ),
+}
+
+# 每个专门助手一条规则：只有明确的“预订/改签类动作 + 对象”才会命中，
+# need/want/find 之类的泛用动词常出现在咨询里，不作为依据
+INTENT_RULES: dict[str, list[re.Pattern]] = {
+    ToFlightBookingAssistant.__name__: [
+        _rule("update|change|reschedule|rebook|cancel|move", "flights?|tickets?"),
+        re.compile(r"(改签|更改|取消|改).{0,6}(航班|机票)|(航班|机票).{0,6}(改签|更改|取消)"),
+    ],
+    ToHotelBookingAssistant.__name__: [
+        _rule("book|reserve", "hotels?|lodging"),
+        re.compile(r"(预订|订).{0,6}酒店"),
+    ],
+    ToBookCarRental.__name__: [
+        _rule("rent|hire|book|reserve", "cars?"),
+        re.compile(r"租车|(预订|订).{0,6}(车|汽车)"),
+    ],
+    ToBookExcursion.__name__: [
+        _rule("book|reserve", "excursions?|tours?|trips?|activit(?:y|ies)|museums?|sightseeing"),
+        re.compile(r"(预订|订).{0,6}(游览|景点|旅游|行程)"),
+    ],
+}
+
+# 政策类提问交给主助手（它有 lookup_policy），不走快速路径
+POLICY_QUESTION = re.compile(
+    r"\b(allowed|policy|policies|fees?|refund|can i|am i|is it possible)\b|政策|允许|费用|退款",
+    re.IGNORECASE,
+)
+
+# 问句（“要不要订酒店？”“去机场在哪个航站楼？”）多半是咨询，也交给 LLM
+QUESTION = re.compile(
+    r"[?？]|^\s*(?:what|which|when|where|who|whom|whose|how|why|do|does|did|is|are|"
+    r"can|could|should|would|will|shall)\b|什么|哪|怎么|如何|(吗|呢)\s*$",
+    re.IGNORECASE,
+)
+
+
+# 否定或推迟（“不要取消”“晚点再订”）说明用户现在并不想执行该操作，交给 LLM
+NEGATION_OR_DEFERRAL = re.compile(
+    r"\b(?:don['’]?t|do not|doesn['’]?t|does not|didn['’]?t|not|never|no need|"
+    r"later|changed my mind)\b|不要|别|不用|先不|以后|稍后|晚点|再说",
+    re.IGNORECASE,
+)
+
+
+def classify_intent(text: str) -> Optional[str]:
+    """Return the `To*` tool name when exactly one specialist clearly matches.
+
+    Only statements with a booking or rebooking verb qualify. Questions,
+    policy questions, negated or deferred requests, messages that mention
+    several specialists' subjects and messages that match none return None,
+    leaving the decision to the LLM.
+    """
+    if not text or any(
+        pattern.search(text) for pattern in (POLICY_QUESTION, QUESTION, NEGATION_OR_DEFERRAL)
+    ):
+        return None
+    mentioned = [name for name, pattern in INTENT_SUBJECTS.items() if pattern.search(text)]
+    if len(mentioned) != 1:
+        return None
+    name = mentioned[0]
+    return name if any(pattern.search(text) for pattern in INTENT_RULES[name]) else None
+
+
+def _last_user_text(state: State) -> str:
+    message = state["messages"][-1] if state["messages"] else None
+    if isinstance(message, HumanMessage) and isinstance(message.content, str):
+        return message.content
+    return ""
+
+
+def fast_route_target(state: State) -> Optional[str]:
+    return classify_intent(_last_user_text(state))
+
+
+def fast_route(state: State) -> dict:
+    """Emit the delegation tool call the primary assistant would have made."""
+    text = _last_user_text(state)
+    name = classify_intent(text)
+    # 参数留空，由专门助手结合对话自行追问
+    args = {"request": text}
+    if name == ToHotelBookingAssistant.__name__:
+        args.update(location="", checkin_date="", checkout_date="")
+    elif name == ToBookCarRental.__name__:
+        args.update(location="", start_date="", end_date="")
+    elif name == ToBookExcursion.__name__:
+        args.update(location="", date="")
+    return {
+        "messages": [
+            AIMessage(
+                content="",
+                tool_calls=[{"name": name, "args": args, "id": f"call_{uuid.uuid4().hex}"}],
+            )
+        ]
+    }
+
+
+# 分类器样例：test.txt 中的全部对话轮次，外加应当/不应当走快速路径的典型说法
+ROUTING_CASES: list[tuple[str, Optional[str]]] = [
+    ("Hi there, what time is my flight?", None),
+    ("Am i allowed to update my flight to something sooner? I want to leave later today.", None),
+    ("Update my flight to sometime next week then", ToFlightBookingAssistant.__name__),
+    ("The next available option is great", None),
+    ("what about lodging and transportation?", None),
+    (
+        "Yeah i think i'd like an affordable hotel for my week-long stay (7 days). "
+        "And I'll want to rent a car.",
+        None,
+    ),
+    ("OK could you place a reservation for your recommended hotel? It sounds nice.", None),
+    ("yes go ahead and book anything that's moderate expense and has availability.", None),
+    ("Now for a car, what are my options?", None),
+    ("Awesome let's just get the cheapest option. Go ahead and book for 7 days", None),
+    ("Cool so now what recommendations do you have on excursions?", None),
+    ("Are they available while I'm there?", None),
+    ("interesting - i like the museums, what options are there? ", None),
+    ("OK great pick one and book it for my second day there.", None),
+    ("My flight got cancelled, do I need a hotel?", None),
+    ("I need a car to get to the airport, which terminal do I go to?", None),
+    ("I need a hotel near the station", None),
+    ("Cancel my ticket 7240005432906569", ToFlightBookingAssistant.__name__),
+    ("Please book a hotel in Zurich from May 2 to May 5", ToHotelBookingAssistant.__name__),
+    ("I'd like to rent a car in Basel for three days", ToBookCarRental.__name__),
+    ("Book the museum tour for Tuesday", ToBookExcursion.__name__),
+    ("帮我把航班改签到下周", ToFlightBookingAssistant.__name__),
+    ("帮我预订苏黎世的酒店", ToHotelBookingAssistant.__name__),
+    ("我要在巴塞尔租车三天", ToBookCarRental.__name__),
+    ("航班取消了，我需要订酒店吗", None),
+    ("Don't cancel my flight, I changed my mind", None),
+    ("Do not cancel my ticket", None),
+    ("I will book a trip later, first tell me the time", None),
+    ("I never asked to rent a car", None),
+    ("不要取消我的航班", None),
+    ("别帮我订酒店了", None),
+    ("以后再预订游览行程", None),
+]
+
+
+if __name__ == "__main__":
+    # python -m assistants.router：检查分类器样例
+    import sys
+
+    failures = [
+        (text, expected, classify_intent(text))
+        for text, expected in ROUTING_CASES
+        if classify_intent(text) != expected
+    ]
+    for text, expected, got in failures:
+        print(f"FAIL {text!r}: expected {expected}, got {got}")
+    print(f"{len(ROUTING_CASES) - len(failures)}/{len(ROUTING_CASES)} routing cases passed")
+    sys.exit(1 if failures else 0)
@@ -2,10 +2,11 @@ from typing import List, Callable
 from langchain.prompts import ChatPromptTemplate
 from langchain_core.runnables import Runnable
 from langgraph.graph import StateGraph, END
-from tools.utilities_tools import create_tool_node_with_fallback
+from tools.utilities_tools import create_parallel_tool_node, create_tool_node_with_fallback
 from langchain_core.messages import ToolMessage
 from assistants.common import State
 from assistants.base import Assistant, CompleteOrEscalate
+from assistants.compaction import DEFAULT_BUDGET, CompactionBudget
 
 def create_entry_node(assistant_name_des: str, new_dialog_state: str) -> Callable:
     """创建入口节点函数"""
@@ -37,8 +38,12 @@ def create_specialized_subgraph(
     sensitive_tools: List[Runnable],
     llm: Runnable,
     route_function: Callable,
+    budget: CompactionBudget = DEFAULT_BUDGET,
 ) -> None:
-    """创建专门的子图（如航班预订、酒店预订等）"""
+    """创建专门的子图（如航班预订、酒店预订等）
+
+    `budget` 限制该助手每次调用 LLM 时携带的历史消息规模。
+    """
     # 创建runnable
     runnable = prompt | llm.bind_tools(
         safe_tools + sensitive_tools + [CompleteOrEscalate]
@@ -50,11 +55,11 @@ def create_specialized_subgraph(
     )
 
     # 添加助手节点
-    builder.add_node(assistant_name, Assistant(runnable))
+    builder.add_node(assistant_name, Assistant(runnable, budget))
 
     # 添加工具节点
     builder.add_node(
-        f"{assistant_name}_safe_tools", create_tool_node_with_fallback(safe_tools)
+        f"{assistant_name}_safe_tools", create_parallel_tool_node(safe_tools)
     )
     builder.add_node(
         f"{assistant_name}_sensitive_tools",
@@ -0,0 +1,65 @@
+import math
+import re
+from collections import Counter, defaultdict
+from typing import Sequence
+
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> list[str]:
+    # 不做词干化：BM25 负责精确词命中（舱位名称、费用金额等）
+    return _TOKEN_RE.findall(text.lower())
+
+
+class BM25Index:
+    """Okapi BM25 over an in-memory inverted index."""
+
+    def __init__(self, texts: Sequence[str], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: dict[str, list[tuple[int, int]]] = defaultdict(list)
+        self._doc_len: list[int] = []
+        for doc_id, text in enumerate(texts):
+            tokens = tokenize(text)
+            self._doc_len.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                self._postings[term].append((doc_id, tf))
+        n = len(self._doc_len)
+        self._avgdl = (sum(self._doc_len) / n) if n else 0.0
+        self._idf = {
+            term: math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for term, postings in self._postings.items()
+        }
+
+    def __len__(self) -> int:
+        return len(self._doc_len)
+
+    def scores(self, query: str) -> dict[int, float]:
+        """BM25 score of every document that contains at least one query term."""
+        result: dict[int, float] = defaultdict(float)
+        for term in set(tokenize(query)):
+            idf = self._idf.get(term)
+            if idf is None:
+                continue
+            for doc_id, tf in self._postings[term]:
+                norm = 1 - self.b + self.b * self._doc_len[doc_id] / self._avgdl
+                result[doc_id] += idf * tf * (self.k1 + 1) / (tf + self.k1 * norm)
+        return result
+
+    def search(self, query: str, k: int) -> list[tuple[float, int]]:
+        """Top `k` `(score, doc_id)` pairs, best first."""
+        ranked = sorted(
+            ((score, doc_id) for doc_id, score in self.scores(query).items()),
+            key=lambda item: (-item[0], item[1]),
+        )
+        return ranked[:k]
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[int]], k: int = 60) -> list[tuple[float, int]]:
+    """Fuse several ranked id lists into `(score, id)` pairs, best first."""
+    fused: dict[int, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            fused[doc_id] += 1.0 / (k + rank + 1)
+    return sorted(((s, i) for i, s in fused.items()), key=lambda item: (-item[0], item[1]))
@@ -0,0 +1,135 @@
+import sqlite3
+
+
+CHANGELOG_TABLE = "flights_changelog"
+# 变更日志最多保留的行数；更早的记录被裁剪后，落后的索引会整体重建
+CHANGELOG_KEEP = 10000
+
+# 每张表一个版本号，由触发器在任何写入后递增；各进程的缓存据此判断是否过期
+VERSION_TABLE = "table_versions"
+VERSIONED_TABLES = ("flights", "ticket_flights", "hotels", "car_rentals", "trip_recommendations")
+
+
+def install_route_changelog(conn: sqlite3.Connection) -> bool:
+    """Create the flights change log and its triggers; True if newly created.
+
+    Runs in the caller's transaction, if any.
+    """
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (CHANGELOG_TABLE,)
+    ).fetchone()
+    if exists:
+        return False
+    # flight_id 为 NULL 的记录表示需要整体重建
+    conn.execute(
+        f"""CREATE TABLE {CHANGELOG_TABLE} (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            flight_id INTEGER
+        )"""
+    )
+    conn.execute(
+        f"""CREATE TRIGGER {CHANGELOG_TABLE}_ai AFTER INSERT ON flights BEGIN
+            INSERT INTO {CHANGELOG_TABLE} (flight_id) VALUES (new.flight_id);
+        END"""
+    )
+    conn.execute(
+        f"""CREATE TRIGGER {CHANGELOG_TABLE}_ad AFTER DELETE ON flights BEGIN
+            INSERT INTO {CHANGELOG_TABLE} (flight_id) VALUES (old.flight_id);
+        END"""
+    )
+    conn.execute(
+        f"""CREATE TRIGGER {CHANGELOG_TABLE}_au AFTER UPDATE OF
+            flight_id, flight_no, departure_airport, arrival_airport,
+            scheduled_departure, scheduled_arrival
+        ON flights BEGIN
+            INSERT INTO {CHANGELOG_TABLE} (flight_id) VALUES (old.flight_id);
+            INSERT INTO {CHANGELOG_TABLE} (flight_id)
+                SELECT new.flight_id WHERE new.flight_id IS NOT old.flight_id;
+        END"""
+    )
+    return True
+
+
+def mark_full_refresh(conn: sqlite3.Connection) -> None:
+    """Replace the change log with a single rebuild marker (after bulk updates).
+
+    Must run inside the caller's transaction.
+    """
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (CHANGELOG_TABLE,)
+    ).fetchone()
+    if exists:
+        conn.execute(f"DELETE FROM {CHANGELOG_TABLE}")
+        conn.execute(f"INSERT INTO {CHANGELOG_TABLE} (flight_id) VALUES (NULL)")
+
+
+def prune_changelog(conn: sqlite3.Connection, keep: int = CHANGELOG_KEEP) -> None:
+    conn.execute(
+        f"DELETE FROM {CHANGELOG_TABLE} WHERE seq <= "
+        f"(SELECT MAX(seq) FROM {CHANGELOG_TABLE}) - ?",
+        (keep,),
+    )
+
+
+def install_table_versions(conn: sqlite3.Connection) -> list[str]:
+    """Create the per-table version counters and their triggers.
+
+    Returns the tables that got new triggers. Runs in the caller's
+    transaction, if any.
+    """
+    conn.execute(
+        f"CREATE TABLE IF NOT EXISTS {VERSION_TABLE} "
+        "(name TEXT PRIMARY KEY, version INTEGER NOT NULL DEFAULT 0) WITHOUT ROWID"
+    )
+    existing = {
+        row[0]
+        for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE ?",
+            (f"{VERSION_TABLE}_%",),
+        )
+    }
+    installed = []
+    for table in VERSIONED_TABLES:
+        conn.execute(f"INSERT OR IGNORE INTO {VERSION_TABLE} (name) VALUES (?)", (table,))
+        for event in ("INSERT", "UPDATE", "DELETE"):
+            trigger = f"{VERSION_TABLE}_{table}_{event.lower()}"
+            if trigger in existing:
+                continue
+            # SQLite 只有行级触发器，批量写入会递增多次，不影响判断
+            conn.execute(
+                f"""CREATE TRIGGER {trigger} AFTER {event} ON {table} BEGIN
+                    UPDATE {VERSION_TABLE} SET version = version + 1 WHERE name = '{table}';
+                END"""
+            )
+            if table not in installed:
+                installed.append(table)
+    return installed
+
+
+def bump_table_version(conn: sqlite3.Connection, table: str) -> None:
+    """Invalidate caches keyed on `table` without writing to it.
+
+    No-op before the version counters are installed. Runs in the caller's
+    transaction, if any.
+    """
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (VERSION_TABLE,)
+    ).fetchone()
+    if exists:
+        conn.execute(f"UPDATE {VERSION_TABLE} SET version = version + 1 WHERE name = ?", (table,))
+
+
+def table_versions(conn: sqlite3.Connection, tables: tuple[str, ...]) -> tuple[int, ...]:
+    """Current version of each of `tables` (0 for tables that are not tracked)."""
+    if not tables:
+        return ()
+    placeholders = ", ".join("?" for _ in tables)
+    # 不受连接的 row_factory 影响，统一按元组读取
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    versions = dict(
+        cursor.execute(
+            f"SELECT name, version FROM {VERSION_TABLE} WHERE name IN ({placeholders})", tables
+        ).fetchall()
+    )
+    return tuple(versions.get(table, 0) for table in tables)
@@ -0,0 +1,252 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Iterator, Optional, Sequence, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import BaseCheckpointSaver, CheckpointTuple
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.checkpoint.sqlite import SqliteSaver
+from langgraph.constants import ERROR, INTERRUPT
+
+
+# "sqlite"（默认，可持久化）或 "memory"
+CHECKPOINTER_BACKEND = os.environ.get("CHECKPOINTER_BACKEND", "sqlite")
+CHECKPOINT_DB = os.environ.get("CHECKPOINT_DB", "checkpoints.sqlite")
+
+
+@dataclass
+class RetentionPolicy:
+    """How much checkpoint history to keep.
+
+    `keep_last` checkpoints are kept per thread (None keeps all), threads idle
+    for longer than `max_idle_seconds` are dropped entirely, and pruning runs
+    once every `prune_every` saved checkpoints.
+    """
+
+    keep_last: Optional[int] = 20
+    max_idle_seconds: Optional[float] = 7 * 24 * 3600
+    prune_every: int = 200
+
+
+class DurableSqliteSaver(SqliteSaver):
+    """`SqliteSaver` with WAL, batched commits and retention.
+
+    Pending writes are not committed on their own; they are committed together
+    with the checkpoint that closes the step (or once `max_pending_writes`
+    accumulate), which turns one fsync per task into one per step. Error and
+    interrupt writes end the run without a following checkpoint, so they are
+    committed at once; any other deferred write is committed after at most
+    `max_defer_seconds` (e.g. a cancelled run), so the write lock on the file
+    is never held past the step. Async methods run the sync implementation
+    in a thread so the same saver serves both `stream` and `astream`.
+    """
+
+    def __init__(
+        self,
+        conn: sqlite3.Connection,
+        *,
+        retention: Optional[RetentionPolicy] = None,
+        max_pending_writes: int = 64,
+        max_defer_seconds: float = 0.5,
+        serde=None,
+    ) -> None:
+        super().__init__(conn, serde=serde)
+        self.retention = retention or RetentionPolicy()
+        self.max_pending_writes = max_pending_writes
+        self.max_defer_seconds = max_defer_seconds
+        self._defer = threading.local()
+        self._pending_writes = 0
+        self._flush_timer: Optional[threading.Timer] = None
+        self._puts_since_prune = 0
+
+    @classmethod
+    def from_path(cls, path: str, **kwargs) -> "DurableSqliteSaver":
+        conn = sqlite3.connect(path, check_same_thread=False)
+        return cls(conn, **kwargs)
+
+    def setup(self) -> None:
+        if self.is_setup:
+            return
+        super().setup()
+        self.conn.executescript(
+            """
+            PRAGMA synchronous=NORMAL;
+            CREATE TABLE IF NOT EXISTS thread_activity (
+                thread_id TEXT PRIMARY KEY,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_thread_activity_updated
+                ON thread_activity (updated_at);
+            """
+        )
+
+    @contextmanager
+    def cursor(self, transaction: bool = True) -> Iterator[sqlite3.Cursor]:
+        with self.lock:
+            self.setup()
+            cur = self.conn.cursor()
+            try:
+                yield cur
+            finally:
+                if transaction and not getattr(self._defer, "active", False):
+                    self._commit()
+                cur.close()
+
+    def _commit(self) -> None:
+        # 调用方需持有 self.lock
+        self.conn.commit()
+        self._pending_writes = 0
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+
+    def flush(self) -> None:
+        """Commit any writes still waiting for their step's checkpoint."""
+        with self.lock:
+            self._commit()
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        self._defer.active = True
+        try:
+            super().put_writes(config, writes, task_id, task_path)
+        finally:
+            self._defer.active = False
+        # 出错或中断后不会再有 checkpoint 来提交，立即提交
+        final = any(channel in (ERROR, INTERRUPT) for channel, _ in writes)
+        with self.lock:
+            self._pending_writes += 1
+            if final or self._pending_writes >= self.max_pending_writes:
+                self._commit()
+            elif self._flush_timer is None:
+                # 兜底：运行被取消时也不会一直占着写锁
+                self._flush_timer = threading.Timer(self.max_defer_seconds, self.flush)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+
+    def put(self, config, checkpoint, metadata, new_versions) -> RunnableConfig:
+        thread_id = str(config["configurable"]["thread_id"])
+        self._defer.active = True
+        try:
+            saved = super().put(config, checkpoint, metadata, new_versions)
+        finally:
+            self._defer.active = False
+        # 记录线程活跃时间，并与 checkpoint 一起提交
+        with self.cursor() as cur:
+            cur.execute(
+                "INSERT OR REPLACE INTO thread_activity (thread_id, updated_at) VALUES (?, ?)",
+                (thread_id, time.time()),
+            )
+        self._puts_since_prune += 1
+        if self._puts_since_prune >= self.retention.prune_every:
+            self._puts_since_prune = 0
+            self.prune()
+        return saved
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self.cursor() as cur:
+            self._delete_threads(cur, [str(thread_id)])
+
+    @staticmethod
+    def _delete_threads(cur: sqlite3.Cursor, thread_ids: list[str]) -> None:
+        for table in ("checkpoints", "writes", "thread_activity"):
+            cur.executemany(
+                f"DELETE FROM {table} WHERE thread_id = ?",
+                [(thread_id,) for thread_id in thread_ids],
+            )
+
+    def prune(self, now: Optional[float] = None) -> None:
+        """Apply the retention policy to every thread."""
+        policy = self.retention
+        with self.cursor() as cur:
+            if policy.max_idle_seconds is not None:
+                cutoff = (now or time.time()) - policy.max_idle_seconds
+                idle = [
+                    row[0]
+                    for row in cur.execute(
+                        "SELECT thread_id FROM thread_activity WHERE updated_at < ?",
+                        (cutoff,),
+                    ).fetchall()
+                ]
+                self._delete_threads(cur, idle)
+            if policy.keep_last is not None:
+                # checkpoint_id 为时间有序的 uuid6，按其倒序保留最新的 N 个
+                cur.execute(
+                    """
+                    DELETE FROM checkpoints WHERE rowid IN (
+                        SELECT rowid FROM (
+                            SELECT rowid, ROW_NUMBER() OVER (
+                                PARTITION BY thread_id, checkpoint_ns
+                                ORDER BY checkpoint_id DESC
+                            ) AS rn
+                            FROM checkpoints
+                        ) WHERE rn > ?
+                    )
+                    """,
+                    (policy.keep_last,),
+                )
+                cur.execute(
+                    """
+                    DELETE FROM writes WHERE NOT EXISTS (
+                        SELECT 1 FROM checkpoints c
+                        WHERE c.thread_id = writes.thread_id
+                            AND c.checkpoint_ns = writes.checkpoint_ns
+                            AND c.checkpoint_id = writes.checkpoint_id
+                    )
+                    """
+                )
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        items = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for item in items:
+            yield item
+
+    async def aput(self, config, checkpoint, metadata, new_versions) -> RunnableConfig:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+
+def create_checkpointer(
+    backend: str = CHECKPOINTER_BACKEND,
+    path: str = CHECKPOINT_DB,
+    retention: Optional[RetentionPolicy] = None,
+) -> BaseCheckpointSaver:
+    """Create the checkpointer the graph is compiled with."""
+    if backend == "memory":
+        return MemorySaver()
+    if backend == "sqlite":
+        return DurableSqliteSaver.from_path(path, retention=retention)
+    raise ValueError(f"Unknown checkpointer backend: {backend}")
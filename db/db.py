@@ -1,67 +1,337 @@
+import filecmp
 import os
 import shutil
 import sqlite3
+import threading
+from datetime import datetime, time, timedelta, timezone
 
-import pandas as pd
-import requests
+from db.changelog import (
+    install_route_changelog,
+    bump_table_version,
+    install_table_versions,
+    mark_full_refresh,
+    prune_changelog,
+)
+from db.fts import install_fts
+from db.schema import optimize_schema
 
 
 db_url = "https://storage.googleapis.com/benchmarks-artifacts/travel-db/travel2.sqlite"
 local_file = "travel2.sqlite"
 # The backup lets us restart for each tutorial section
 backup_file = "travel2.backup.sqlite"
-overwrite = False
-if overwrite or not os.path.exists(local_file):
-    response = requests.get(db_url)
-    response.raise_for_status()  # Ensure the request was successful
-    with open(local_file, "wb") as f:
-        f.write(response.content)
-    # Backup - we will use this to "reset" our DB in each section
-    shutil.copy(local_file, backup_file)
 
-# Convert the flights to present time for our tutorial
-def update_dates(file):
-    shutil.copy(backup_file, file)
-    conn = sqlite3.connect(file)
-    cursor = conn.cursor()
+# 需要平移到当前时间的列，其余表保持不动
+FLIGHT_DATETIME_COLUMNS = (
+    "scheduled_departure",
+    "scheduled_arrival",
+    "actual_departure",
+    "actual_arrival",
+)
+BOOKING_DATETIME_COLUMNS = ("book_date",)
+
+# 记录数据的锚点（表中最晚的实际起飞时间）及其当前对应的时刻，二者之差即查询时的偏移
+REBASE_TABLE = "_rebase_offset"
+# 目标时刻漂移小于该值时不做任何写入，并发启动的进程因此共享同一偏移
+REBASE_TOLERANCE = timedelta(minutes=10)
+
+# 等待其他进程完成准备的最长时间（秒）；首次准备要建索引和全文索引
+PREPARE_TIMEOUT = float(os.environ.get("TRAVEL_DB_PREPARE_TIMEOUT", "300"))
+
+
+def _parse_timestamp(value):
+    """Parse a timestamp stored in the travel DB, returning None for NULL markers."""
+    if value is None:
+        return None
+    text = str(value).strip()
+    if not text or text == "\\N":
+        return None
+    text = text.replace("T", " ")
+    # "2024-04-30 09:20:00.000 +0200" / "... +02" -> "... +02:00"
+    for sign in ("+", "-"):
+        idx = text.rfind(sign)
+        if idx > 10:
+            offset = text[idx + 1 :].replace(":", "")
+            if offset.isdigit() and len(offset) in (2, 4):
+                offset = offset.ljust(4, "0")
+                text = f"{text[:idx].rstrip()}{sign}{offset[:2]}:{offset[2:]}"
+            break
+    parsed = datetime.fromisoformat(text)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+def _shift_timestamp(value, seconds):
+    """SQL function: shift a stored timestamp by `seconds`, keeping NULL markers as-is."""
+    parsed = _parse_timestamp(value)
+    if parsed is None:
+        return value
+    return (parsed + timedelta(seconds=seconds)).isoformat(sep=" ")
+
+
+def _latest_departure(conn):
+    # 流式扫描一遍 actual_departure 取最大值，不加载整表
+    latest = None
+    for (value,) in conn.execute("SELECT actual_departure FROM flights"):
+        parsed = _parse_timestamp(value)
+        if parsed is not None and (latest is None or parsed > latest):
+            latest = parsed
+    return latest
+
 
-    tables = pd.read_sql(
-        "SELECT name FROM sqlite_master WHERE type='table';", conn
-    ).name.tolist()
-    tdf = {}
-    for t in tables:
-        tdf[t] = pd.read_sql(f"SELECT * from {t}", conn)
-
-    example_time = pd.to_datetime(
-        tdf["flights"]["actual_departure"].replace("\\N", pd.NaT)
-    ).max()
-    current_time = pd.to_datetime("now").tz_localize(example_time.tz)
-    time_diff = current_time - example_time
-
-    tdf["bookings"]["book_date"] = (
-        pd.to_datetime(tdf["bookings"]["book_date"].replace("\\N", pd.NaT), utc=True)
-        + time_diff
-    )
-
-    datetime_columns = [
-        "scheduled_departure",
-        "scheduled_arrival",
-        "actual_departure",
-        "actual_arrival",
-    ]
-    for column in datetime_columns:
-        tdf["flights"][column] = (
-            pd.to_datetime(tdf["flights"][column].replace("\\N", pd.NaT)) + time_diff
+def _shift_tables(conn, seconds):
+    conn.create_function("shift_timestamp", 2, _shift_timestamp, deterministic=True)
+    for table, columns in (
+        ("flights", FLIGHT_DATETIME_COLUMNS),
+        ("bookings", BOOKING_DATETIME_COLUMNS),
+    ):
+        assignments = ", ".join(
+            f"{column} = shift_timestamp({column}, :seconds)" for column in columns
         )
+        conn.execute(f"UPDATE {table} SET {assignments}", {"seconds": seconds})
+    # 整表平移后逐行变更日志没有意义，改为通知路由索引整体重建
+    mark_full_refresh(conn)
+
+
+def rebase_dates(conn, now=None, tolerance=REBASE_TOLERANCE):
+    """Return the offset that makes `flights` and `bookings` timestamps look current.
+
+    A fresh working copy is shifted in place once and its anchor recorded.
+    After that the stored timestamps are left alone: only the recorded target
+    moves (one row) when it has drifted by more than `tolerance`, and readers
+    fetch the offset with `read_offset` and apply it at query time
+    (`to_present` / `to_stored`). Runs under `BEGIN IMMEDIATE` (or the
+    caller's transaction), so processes starting together agree on a single
+    offset.
+    """
+    now = now or datetime.now(timezone.utc)
+    own_transaction = not conn.in_transaction
+    if own_transaction:
+        conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {REBASE_TABLE} ("
+            "id INTEGER PRIMARY KEY CHECK (id = 1), "
+            "anchor TEXT NOT NULL, target TEXT NOT NULL)"
+        )
+        row = conn.execute(f"SELECT anchor, target FROM {REBASE_TABLE} WHERE id = 1").fetchone()
+        if row is None:
+            latest = _latest_departure(conn)
+            if latest is None:
+                offset = timedelta(0)
+            else:
+                # 首次使用该工作副本：整表平移一次（同时统一时间格式），之后只改偏移
+                _shift_tables(conn, (now - latest).total_seconds())
+                conn.execute(
+                    f"INSERT INTO {REBASE_TABLE} (id, anchor, target) VALUES (1, ?, ?)",
+                    (now.isoformat(sep=" "), now.isoformat(sep=" ")),
+                )
+                offset = timedelta(0)
+        else:
+            anchor, target = _parse_timestamp(row[0]), _parse_timestamp(row[1])
+            if abs(now - target) >= tolerance:
+                target = now
+                conn.execute(
+                    f"UPDATE {REBASE_TABLE} SET target = ? WHERE id = 1",
+                    (target.isoformat(sep=" "),),
+                )
+                # 偏移变了，按 flights 版本号缓存的结果（含平移后的时间）一并失效
+                bump_table_version(conn, "flights")
+            offset = target - anchor
+    except BaseException:
+        if own_transaction:
+            conn.rollback()
+        raise
+    if own_transaction:
+        conn.commit()
+    return offset
+
+
+def read_offset(conn) -> timedelta:
+    """Current shared offset (`target - anchor`), zero before the first rebase.
+
+    A single primary-key read: callers fetch it once per tool call so every
+    worker uses the target last recorded by any of them.
+    """
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    try:
+        row = cursor.execute(f"SELECT anchor, target FROM {REBASE_TABLE} WHERE id = 1").fetchone()
+    except sqlite3.OperationalError:
+        return timedelta(0)
+    if row is None:
+        return timedelta(0)
+    return _parse_timestamp(row[1]) - _parse_timestamp(row[0])
+
+
+def to_present(value, offset: timedelta):
+    """Turn a stored flight or booking timestamp into the time shown to users."""
+    if not offset:
+        return value
+    return _shift_timestamp(value, offset.total_seconds())
+
+
+def to_stored(value, offset: timedelta):
+    """Turn a time bound from a tool argument into one comparable with stored values."""
+    if not value or not offset:
+        return value
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if not isinstance(value, datetime):
+        value = datetime.combine(value, time.min)
+    return (value - offset).isoformat(sep=" ")
+
+
+# Convert the flights to present time for our tutorial
+def update_dates(file, reset=False):
+    """Rebase `file` to the present time, restoring it from the backup on `reset`."""
+    return Database(path=file).prepare(reset=reset)
+
+
+class Database:
+    """The travel DB used by the tools.
+
+    Nothing touches the network or the filesystem until `ensure_downloaded()`
+    or `prepare()` is called. Pass `fixture` to seed the backup from a local
+    file instead of downloading it (tests, offline runs).
+    """
+
+    def __init__(
+        self,
+        path: str = local_file,
+        backup_path: str = backup_file,
+        url: str = db_url,
+        fixture: str | None = None,
+    ):
+        self._path = path
+        self.backup_path = backup_path
+        self.url = url
+        self.fixture = fixture
+        self._prepared = False
+
+    @property
+    def path(self) -> str:
+        """Path of the working copy the tools read from and write to."""
+        return self._path
+
+    @property
+    def prepared(self) -> bool:
+        return self._prepared
+
+    def _sync_fixture(self, overwrite: bool = False) -> bool:
+        """Copy `fixture` over the backup unless they already match.
+
+        Returns True when an existing backup with different contents was
+        replaced, i.e. a working copy made from it is stale.
+        """
+        existed = os.path.exists(self.backup_path)
+        # copy2 保留 mtime，之后的浅比较只看 stat，无需逐字节读取
+        if existed and not overwrite and filecmp.cmp(self.fixture, self.backup_path):
+            return False
+        tmp_path = f"{self.backup_path}.{os.getpid()}.part"
+        shutil.copy2(self.fixture, tmp_path)
+        os.replace(tmp_path, self.backup_path)
+        return existed
+
+    def ensure_downloaded(self, overwrite: bool = False) -> str:
+        """Make sure the pristine backup exists and return its path.
+
+        With `fixture` set the backup always mirrors it, even if a backup
+        from another source is already there.
+        """
+        if self.fixture:
+            self._sync_fixture(overwrite)
+            return self.backup_path
+        if not overwrite and os.path.exists(self.backup_path):
+            return self.backup_path
+
+        import requests
+
+        response = requests.get(self.url)
+        response.raise_for_status()  # Ensure the request was successful
+        tmp_path = f"{self.backup_path}.part"
+        with open(tmp_path, "wb") as f:
+            f.write(response.content)
+        os.replace(tmp_path, self.backup_path)
+        return self.backup_path
+
+    def _create_working_copy(self, replace: bool) -> None:
+        self.ensure_downloaded()
+        # 先复制到临时文件再原子地放到位，其他进程不会打开半成品
+        tmp_path = f"{self._path}.{os.getpid()}.tmp"
+        shutil.copy(self.backup_path, tmp_path)
+        try:
+            if replace:
+                os.replace(tmp_path, self._path)
+            else:
+                # 已被其他进程创建时保留对方的副本
+                os.link(tmp_path, self._path)
+        except FileExistsError:
+            pass
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def prepare(self, reset: bool = False) -> str:
+        """Create the working copy if needed, record the date offset and
+        make sure the secondary and full-text indexes, the flights change
+        log and the table version counters exist.
+
+        Everything runs in one `BEGIN IMMEDIATE` transaction, so processes
+        preparing the same copy at once take turns; the later ones find it
+        ready and only read. A working copy made from a backup that no
+        longer matches `fixture` is rebuilt; change the fixture only while
+        no worker is running.
+        """
+        if self.fixture and self._sync_fixture() and os.path.exists(self._path):
+            reset = True
+        if reset or not os.path.exists(self._path):
+            self._create_working_copy(replace=reset)
+        conn = sqlite3.connect(self._path, timeout=PREPARE_TIMEOUT, isolation_level=None)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                rebase_dates(conn)
+                optimize_schema(conn)
+                install_fts(conn)
+                if not install_route_changelog(conn):
+                    prune_changelog(conn)
+                install_table_versions(conn)
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+        self._prepared = True
+        return self._path
+
 
-    for table_name, df in tdf.items():
-        df.to_sql(table_name, conn, if_exists="replace", index=False)
-    del df
-    del tdf
-    conn.commit()
-    conn.close()
+_db: Database | None = None
+_db_lock = threading.Lock()
 
-    return file
 
+def get_db() -> Database:
+    """Return the process-wide prepared `Database`, creating it on first use.
 
-db = update_dates(local_file)
\ No newline at end of file
+    `Database` holds no connections or per-process state, so workers forked
+    after the first call keep their parent's prepared instance instead of
+    preparing again; the date offset is read from the shared DB per call.
+    `TRAVEL_DB_PATH`, `TRAVEL_DB_BACKUP_PATH` and `TRAVEL_DB_FIXTURE`
+    override the working copy location, the backup location and the
+    download source.
+    """
+    global _db
+    if _db is not None:
+        return _db
+    with _db_lock:
+        if _db is None:
+            database = Database(
+                path=os.environ.get("TRAVEL_DB_PATH", local_file),
+                backup_path=os.environ.get("TRAVEL_DB_BACKUP_PATH", backup_file),
+                fixture=os.environ.get("TRAVEL_DB_FIXTURE"),
+            )
+            database.prepare()
+            _db = database
+    return _db
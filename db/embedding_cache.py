@@ -0,0 +1,91 @@
+import hashlib
+import json
+import os
+import threading
+from typing import Callable, Sequence
+
+import numpy as np
+
+
+class EmbeddingCache:
+    """On-disk embedding store keyed by the hash of model + text.
+
+    Vectors live in `vectors.npy` (memory-mapped on load) and the row for each
+    content hash is recorded in `manifest.json`. Only texts that are not in
+    the cache yet are sent to the embedding function.
+    """
+
+    def __init__(self, directory: str, model: str):
+        self.directory = directory
+        self.model = model
+        self._vectors_path = os.path.join(directory, "vectors.npy")
+        self._manifest_path = os.path.join(directory, "manifest.json")
+        self._lock = threading.Lock()
+
+    def key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model}\0{text}".encode("utf-8")).hexdigest()
+
+    def _load(self) -> tuple[dict[str, int], np.ndarray | None]:
+        try:
+            with open(self._manifest_path, encoding="utf-8") as f:
+                manifest = json.load(f)
+            vectors = np.load(self._vectors_path, mmap_mode="r")
+        except (FileNotFoundError, ValueError):
+            return {}, None
+        keys = manifest.get("keys", [])
+        if manifest.get("model") != self.model or len(keys) != len(vectors):
+            # 清单与矩阵不一致（例如写入被中断），整体作废
+            return {}, None
+        return {k: i for i, k in enumerate(keys)}, vectors
+
+    def _save(self, keys: list[str], vectors: np.ndarray) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_vectors = f"{self._vectors_path}.{os.getpid()}.tmp"
+        tmp_manifest = f"{self._manifest_path}.{os.getpid()}.tmp"
+        with open(tmp_vectors, "wb") as f:
+            np.save(f, vectors)
+        with open(tmp_manifest, "w", encoding="utf-8") as f:
+            json.dump({"model": self.model, "dim": vectors.shape[1], "keys": keys}, f)
+        os.replace(tmp_vectors, self._vectors_path)
+        os.replace(tmp_manifest, self._manifest_path)
+
+    def get_or_embed(
+        self,
+        texts: Sequence[str],
+        embed: Callable[[list[str]], Sequence[Sequence[float]]],
+    ) -> np.ndarray:
+        """Return one row per text, calling `embed` only for unseen texts.
+
+        The cache keeps exactly the rows of the texts in this call: when a
+        text is new or an old one is no longer requested, the file is
+        rewritten with the current rows only, so it does not grow over time.
+        """
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        with self._lock:
+            index, cached = self._load()
+            text_keys = [self.key(text) for text in texts]
+            keys = list(dict.fromkeys(text_keys))
+            missing = [k for k in keys if k not in index]
+            if not missing and len(index) == len(keys):
+                return np.asarray(cached[[index[k] for k in text_keys]])
+
+            fresh = None
+            if missing:
+                missing_texts = {k: t for k, t in zip(text_keys, texts) if k not in index}
+                fresh = np.asarray(
+                    embed([missing_texts[k] for k in missing]), dtype=np.float32
+                )
+            dim = fresh.shape[1] if fresh is not None else cached.shape[1]
+            vectors = np.empty((len(keys), dim), dtype=np.float32)
+            position = {k: i for i, k in enumerate(keys)}
+            kept = [k for k in keys if k in index]
+            if kept:
+                # 只按行号读取仍在使用的行，不把整个 mmap 读进内存
+                vectors[[position[k] for k in kept]] = cached[[index[k] for k in kept]]
+            if fresh is not None:
+                vectors[[position[k] for k in missing]] = fresh
+            # 先释放 mmap 再替换文件
+            del cached
+            self._save(keys, vectors)
+            return vectors[[position[k] for k in text_keys]]
@@ -0,0 +1,99 @@
+import math
+import re
+import zlib
+from typing import Protocol, Sequence
+
+import numpy as np
+
+
+EMBEDDING_MODEL = "text-embedding-3-small"
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+class EmbeddingProvider(Protocol):
+    """Turns texts into vectors for the retriever.
+
+    `name` identifies the embedding space and is used as the cache key;
+    providers whose vectors depend on the corpus set `cacheable = False`.
+    """
+
+    name: str
+    cacheable: bool
+
+    def embed(self, texts: Sequence[str]) -> Sequence[Sequence[float]]: ...
+
+
+class OpenAIEmbeddings:
+    """Embeddings from an OpenAI-compatible `embeddings.create` endpoint."""
+
+    cacheable = True
+
+    def __init__(self, client, model: str = EMBEDDING_MODEL):
+        self._client = client
+        self.name = model
+
+    def embed(self, texts: Sequence[str]) -> list[list[float]]:
+        embeddings = self._client.embeddings.create(model=self.name, input=list(texts))
+        return [emb.embedding for emb in embeddings.data]
+
+
+class HashingEmbeddings:
+    """Local hashed TF-IDF embeddings; no network, deterministic across runs.
+
+    Unigrams and bigrams are hashed into `dim` signed buckets with sublinear
+    term frequency. Call `fit()` on the corpus to weight buckets by IDF.
+    """
+
+    cacheable = False
+
+    def __init__(self, dim: int = 2048):
+        self.dim = dim
+        self.name = f"hashing-tfidf-{dim}"
+        self._idf = np.ones(dim, dtype=np.float32)
+
+    @staticmethod
+    def _stem(token: str) -> str:
+        # 轻量词形归一：change/changes/changed/changing -> chang
+        for suffix in ("ing", "ed", "es", "e", "s"):
+            if len(token) > len(suffix) + 2 and token.endswith(suffix):
+                return token[: -len(suffix)]
+        return token
+
+    def _features(self, text: str) -> list[str]:
+        tokens = [self._stem(t) for t in _TOKEN_RE.findall(text.lower())]
+        return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+    def _bucket(self, feature: str) -> tuple[int, float]:
+        h = zlib.crc32(feature.encode("utf-8"))
+        return h % self.dim, (1.0 if (h >> 31) & 1 else -1.0)
+
+    def _term_counts(self, text: str) -> dict[int, float]:
+        counts: dict[int, float] = {}
+        for feature in self._features(text):
+            bucket, sign = self._bucket(feature)
+            counts[bucket] = counts.get(bucket, 0.0) + sign
+        return counts
+
+    def fit(self, texts: Sequence[str]) -> "HashingEmbeddings":
+        df = np.zeros(self.dim, dtype=np.float32)
+        for text in texts:
+            for bucket in self._term_counts(text):
+                df[bucket] += 1
+        self._idf = (np.log((1 + len(texts)) / (1 + df)) + 1).astype(np.float32)
+        return self
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for bucket, count in self._term_counts(text).items():
+                if count:
+                    matrix[row, bucket] = math.copysign(1 + math.log(abs(count)), count)
+        return matrix * self._idf
+
+
+def as_provider(client_or_provider) -> EmbeddingProvider:
+    """Wrap a raw OpenAI client so older call sites keep working."""
+    if hasattr(client_or_provider, "embed"):
+        return client_or_provider
+    return OpenAIEmbeddings(client_or_provider)
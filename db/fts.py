@@ -0,0 +1,133 @@
+import sqlite3
+from dataclasses import dataclass, field
+from typing import Mapping, Optional, Sequence
+
+
+# 需要全文检索的表及列；FTS 表为外部内容表，按 rowid 关联基础表
+FTS_TABLES = {
+    "hotels": ("name", "location"),
+    "car_rentals": ("name", "location"),
+    "trip_recommendations": ("name", "location", "keywords"),
+}
+
+# trigram 分词器要求检索词至少 3 个字符
+MIN_TERM_CHARS = 3
+
+
+def fts_table(table: str) -> str:
+    return f"{table}_fts"
+
+
+def fts5_available(conn: sqlite3.Connection) -> bool:
+    """Whether this SQLite build has FTS5 with the trigram tokenizer."""
+    try:
+        conn.execute("CREATE VIRTUAL TABLE temp._fts_probe USING fts5(x, tokenize='trigram')")
+        conn.execute("DROP TABLE temp._fts_probe")
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+
+def _has_table(conn: sqlite3.Connection, name: str) -> bool:
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+    ).fetchone()
+    return row is not None
+
+
+def _install_statements(table: str, columns: Sequence[str]) -> list[str]:
+    fts = fts_table(table)
+    cols = ", ".join(columns)
+    new_values = ", ".join(f"new.{c}" for c in columns)
+    old_values = ", ".join(f"old.{c}" for c in columns)
+    return [
+        f"""CREATE VIRTUAL TABLE {fts} USING fts5(
+            {cols}, content='{table}', tokenize='trigram'
+        )""",
+        f"""CREATE TRIGGER {fts}_ai AFTER INSERT ON {table} BEGIN
+            INSERT INTO {fts} (rowid, {cols}) VALUES (new.rowid, {new_values});
+        END""",
+        f"""CREATE TRIGGER {fts}_ad AFTER DELETE ON {table} BEGIN
+            INSERT INTO {fts} ({fts}, rowid, {cols}) VALUES ('delete', old.rowid, {old_values});
+        END""",
+        f"""CREATE TRIGGER {fts}_au AFTER UPDATE OF {cols} ON {table} BEGIN
+            INSERT INTO {fts} ({fts}, rowid, {cols}) VALUES ('delete', old.rowid, {old_values});
+            INSERT INTO {fts} (rowid, {cols}) VALUES (new.rowid, {new_values});
+        END""",
+        f"INSERT INTO {fts} ({fts}) VALUES ('rebuild')",
+    ]
+
+
+def install_fts(conn: sqlite3.Connection) -> list[str]:
+    """Create the FTS indexes and their sync triggers; returns the new tables.
+
+    Safe to call on every start; runs in the caller's transaction, if any.
+    Does nothing when FTS5/trigram is missing, in which case searches fall
+    back to LIKE.
+    """
+    missing = [
+        table
+        for table in FTS_TABLES
+        if _has_table(conn, table) and not _has_table(conn, fts_table(table))
+    ]
+    if not missing or not fts5_available(conn):
+        return []
+    for table in missing:
+        for statement in _install_statements(table, FTS_TABLES[table]):
+            conn.execute(statement)
+    return missing
+
+
+def _quote(term: str) -> str:
+    return '"' + term.replace('"', '""') + '"'
+
+
+@dataclass
+class TextSearch:
+    """SQL fragments for a text search, to splice into a `search_table` call.
+
+    With FTS, `join` restricts the base table to matching rows and exposes
+    their bm25 score as `_rank`; terms that are too short for the trigram
+    index become LIKE clauses in `where`.
+    """
+
+    join: str = ""
+    join_params: list = field(default_factory=list)
+    where: list[str] = field(default_factory=list)
+    params: list = field(default_factory=list)
+
+    @property
+    def ranked(self) -> bool:
+        return bool(self.join)
+
+
+def text_search(
+    conn: sqlite3.Connection,
+    table: str,
+    terms: Mapping[str, Optional[Sequence[str]]],
+) -> TextSearch:
+    """Build substring filters for `terms` (column -> alternatives).
+
+    Alternatives of one column are ORed, columns are ANDed, matching is
+    case-insensitive, the same as `column LIKE '%term%'`.
+    """
+    use_fts = _has_table(conn, fts_table(table))
+    search = TextSearch()
+    expressions = []
+    for column, alternatives in terms.items():
+        alternatives = [a.strip() for a in alternatives or () if a and a.strip()]
+        if not alternatives:
+            continue
+        if use_fts and all(len(a) >= MIN_TERM_CHARS for a in alternatives):
+            expressions.append(f"{column} : ({' OR '.join(_quote(a) for a in alternatives)})")
+        else:
+            search.where.append("(" + " OR ".join(f"{column} LIKE ?" for _ in alternatives) + ")")
+            search.params.extend(f"%{a}%" for a in alternatives)
+    if expressions:
+        fts = fts_table(table)
+        search.join = (
+            f" JOIN (SELECT rowid AS _fts_rowid, bm25({fts}) AS _rank FROM {fts}"
+            f" WHERE {fts} MATCH ?) AS _fts ON _fts._fts_rowid = {table}.rowid"
+        )
+        search.join_params.append(" AND ".join(expressions))
+    return search
@@ -0,0 +1,155 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import timedelta
+from typing import Iterator
+
+from db.changelog import table_versions
+from db.db import get_db, read_offset
+
+
+# 连接级 PRAGMA：WAL 允许读写并发，NORMAL 在 WAL 下仍保证一致性
+MMAP_SIZE = 256 * 1024 * 1024
+CACHE_SIZE_KIB = 64 * 1024
+BUSY_TIMEOUT_MS = 5000
+
+
+def dict_factory(cursor: sqlite3.Cursor, row: tuple) -> dict:
+    """Row factory returning plain dicts, the shape every tool hands to the LLM."""
+    fields = [column[0] for column in cursor.description]
+    return dict(zip(fields, row))
+
+
+def update_returning(
+    conn: sqlite3.Connection, table: str, row_id, values: dict
+) -> dict | None:
+    """Apply all `values` to row `row_id` in one UPDATE and return the new row.
+
+    Returns None when no row has that id. Run it inside `ConnectionPool.write()`
+    so the statement is part of a `BEGIN IMMEDIATE` transaction.
+    """
+    assignments = ", ".join(f"{column} = ?" for column in values)
+    return conn.execute(
+        f"UPDATE {table} SET {assignments} WHERE id = ? RETURNING *",
+        (*values.values(), row_id),
+    ).fetchone()
+
+
+class ConnectionPool:
+    """Shared SQLite connections for the tools.
+
+    Each thread gets its own long-lived read connection, while all writes go
+    through one connection guarded by a lock and wrapped in `BEGIN IMMEDIATE`,
+    so concurrent bookings queue up here instead of failing with
+    "database is locked".
+    """
+
+    def __init__(
+        self,
+        path: str,
+        mmap_size: int = MMAP_SIZE,
+        cache_size_kib: int = CACHE_SIZE_KIB,
+        busy_timeout_ms: int = BUSY_TIMEOUT_MS,
+    ):
+        self.path = path
+        self.mmap_size = mmap_size
+        self.cache_size_kib = cache_size_kib
+        self.busy_timeout_ms = busy_timeout_ms
+        self._local = threading.local()
+        self._write_lock = threading.RLock()
+        self._writer: sqlite3.Connection | None = None
+
+    def _connect(self, check_same_thread: bool = True) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.path,
+            timeout=self.busy_timeout_ms / 1000,
+            isolation_level=None,  # 事务由 write() 显式控制
+            check_same_thread=check_same_thread,
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+        conn.execute(f"PRAGMA cache_size=-{int(self.cache_size_kib)}")
+        conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+        conn.row_factory = dict_factory
+        return conn
+
+    def reader(self) -> sqlite3.Connection:
+        """Return the calling thread's read connection."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def read(self) -> Iterator[sqlite3.Connection]:
+        yield self.reader()
+
+    @contextmanager
+    def write(self) -> Iterator[sqlite3.Connection]:
+        """Run the block as one serialized `BEGIN IMMEDIATE` transaction."""
+        with self._write_lock:
+            if self._writer is None:
+                self._writer = self._connect(check_same_thread=False)
+            conn = self._writer
+            if conn.in_transaction:
+                # 嵌套调用复用外层事务
+                yield conn
+                return
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            else:
+                conn.execute("COMMIT")
+
+    def close(self) -> None:
+        """Close the writer and the calling thread's reader.
+
+        Readers owned by other threads are closed when those threads exit.
+        """
+        with self._write_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+_pool: ConnectionPool | None = None
+_pool_pid: int | None = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """Return the process-wide pool for the prepared travel DB."""
+    global _pool, _pool_pid
+    pid = os.getpid()
+    if _pool is not None and _pool_pid == pid:
+        return _pool
+    with _pool_lock:
+        if _pool is None or _pool_pid != pid:
+            _pool, _pool_pid = ConnectionPool(get_db().path), pid
+    return _pool
+
+
+def read_table_versions(tables: tuple[str, ...]) -> tuple[int, ...]:
+    """Shared version counters of `tables` (see `db.changelog.table_versions`).
+
+    Every process sees the same values, so caches keyed on them notice
+    writes made by other workers.
+    """
+    with get_pool().read() as conn:
+        return table_versions(conn, tables)
+
+
+def read_date_offset() -> timedelta:
+    """Shared date offset of the travel DB (see `db.db.read_offset`)."""
+    with get_pool().read() as conn:
+        return read_offset(conn)
@@ -1,58 +1,180 @@
-import re
 import os
+import re
+import threading
+
 import numpy as np
 from langchain_core.tools import tool
-import requests
-from openai import OpenAI
 
-
-client = OpenAI(
-    base_url=os.environ.get('MODEL_BASE_URL'),
-    api_key=os.environ.get('OPENAI_API_KEY')
+from db.bm25 import BM25Index, reciprocal_rank_fusion
+from db.cache import TTLCache
+from db.embedding_cache import EmbeddingCache
+from db.embeddings import (
+    EmbeddingProvider,
+    HashingEmbeddings,
+    OpenAIEmbeddings,
+    as_provider,
 )
+from db.vector_index import VectorIndex, build_index, normalize_rows
 
 
-response = requests.get(
-    "https://storage.googleapis.com/benchmarks-artifacts/travel-db/swiss_faq.md"
-)
-response.raise_for_status()
-faq_text = response.text
+faq_url = "https://storage.googleapis.com/benchmarks-artifacts/travel-db/swiss_faq.md"
+faq_file = "swiss_faq.md"
+# FAQ 向量缓存目录，热启动时无需再调用 embedding 接口
+EMBEDDING_CACHE_DIR = os.environ.get("EMBEDDING_CACHE_DIR", ".cache/embeddings")
+# "openai" 或 "local"（本地哈希 TF-IDF，无需网络）
+EMBEDDING_PROVIDER = os.environ.get("EMBEDDING_PROVIDER", "openai")
+
+
+def load_faq_docs(url: str = faq_url, path: str = faq_file) -> list[dict]:
+    """Load the FAQ (downloading it once to `path`) and split it into one document per section."""
+    if not os.path.exists(path):
+        import requests
+
+        response = requests.get(url)
+        response.raise_for_status()
+        tmp_path = f"{path}.part"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(response.text)
+        os.replace(tmp_path, path)
+    with open(path, encoding="utf-8") as f:
+        faq_text = f.read()
+    return [{"page_content": txt} for txt in re.split(r"(?=\n##)", faq_text)]
+
+
+def create_embedding_provider(name: str = EMBEDDING_PROVIDER) -> EmbeddingProvider:
+    if name == "local":
+        return HashingEmbeddings()
+    if name == "openai":
+        from openai import OpenAI
+
+        client = OpenAI(
+            base_url=os.environ.get('MODEL_BASE_URL'),
+            api_key=os.environ.get('OPENAI_API_KEY')
+        )
+        return OpenAIEmbeddings(client)
+    raise ValueError(f"Unknown embedding provider: {name}")
 
-docs = [{"page_content": txt} for txt in re.split(r"(?=\n##)", faq_text)]
 
 class VectorStoreRetriever:
-    def __init__(self, docs: list, vectors: list, oai_client):
-        self._arr = np.array(vectors)
+    def __init__(
+        self,
+        docs: list,
+        vectors: list,
+        embedder: EmbeddingProvider,
+        query_cache_size: int = 1024,
+        index_backend: str = "auto",
+        hybrid: bool = True,
+        rrf_k: int = 60,
+    ):
+        # 向量预先归一化为 float32，得分即余弦相似度
+        self._index: VectorIndex = build_index(vectors, backend=index_backend)
         self._docs = docs
-        self._client = oai_client
+        # 稠密检索 + BM25 关键词检索，按 RRF 融合排序
+        self._bm25 = BM25Index([doc["page_content"] for doc in docs]) if hybrid else None
+        self._rrf_k = rrf_k
+        self._embedder = as_provider(embedder)
+        # 归一化查询 -> 向量，重复的政策问题无需再次请求 embedding
+        self._query_cache = TTLCache(maxsize=query_cache_size)
 
     @classmethod
-    def from_docs(cls, docs, oai_client):
-        embeddings = oai_client.embeddings.create(
-            model="text-embedding-3-small", input=[doc["page_content"] for doc in docs]
-        )
-        vectors = [emb.embedding for emb in embeddings.data]
-        return cls(docs, vectors, oai_client)
+    def from_docs(cls, docs, embedder: EmbeddingProvider, cache: EmbeddingCache | None = None):
+        embedder = as_provider(embedder)
+        texts = [doc["page_content"] for doc in docs]
+        if hasattr(embedder, "fit"):
+            embedder.fit(texts)
+        if cache is None or not embedder.cacheable:
+            vectors = embedder.embed(texts)
+        else:
+            vectors = cache.get_or_embed(texts, embedder.embed)
+        return cls(docs, vectors, embedder)
+
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        return " ".join(query.lower().split())
+
+    def cache_info(self) -> dict:
+        """Hit/miss counters of the query-embedding cache."""
+        return self._query_cache.stats()
+
+    def _embed_queries(self, queries: list[str]) -> np.ndarray:
+        keys = [self.normalize_query(q) for q in queries]
+        vectors = {}
+        pending = {}
+        for key, query in zip(keys, queries):
+            if key in vectors or key in pending:
+                continue
+            cached = self._query_cache.get(key)
+            if cached is None:
+                pending[key] = query
+            else:
+                vectors[key] = cached
+        if pending:
+            # 所有未命中的查询合并为一次 embedding 请求
+            fresh = normalize_rows(self._embedder.embed(list(pending.values())))
+            for key, vector in zip(pending, fresh):
+                self._query_cache.set(key, vector)
+                vectors[key] = vector
+        return np.vstack([vectors[key] for key in keys])
 
     def query(self, query: str, k: int = 5) -> list[dict]:
-        embed = self._client.embeddings.create(
-            model="text-embedding-3-small", input=[query]
-        )
-        # "@" is just a matrix multiplication in python
-        scores = np.array(embed.data[0].embedding) @ self._arr.T # 矩阵乘法计算相似度
-        top_k_idx = np.argpartition(scores, -k)[-k:]
-        top_k_idx_sorted = top_k_idx[np.argsort(-scores[top_k_idx])]
-        return [
-            {**self._docs[idx], "similarity": scores[idx]} for idx in top_k_idx_sorted
-        ]
+        return self.query_many([query], k=k)[0]
+
+    def query_many(self, queries: list[str], k: int = 5) -> list[list[dict]]:
+        """Return the top `k` documents for each query, embedding all queries in one request."""
+        if not queries:
+            return []
+        # 混合检索时每一路多取一些候选，再融合截断到 k
+        depth = k if self._bm25 is None else max(4 * k, 20)
+        hits = self._index.search(self._embed_queries(queries), depth)
+        results = []
+        for query, (scores, ids) in zip(queries, hits):
+            similarity = {int(i): float(score) for score, i in zip(scores, ids)}
+            if self._bm25 is None:
+                ranked = [(score, i) for i, score in similarity.items()][:k]
+            else:
+                lexical = [i for _, i in self._bm25.search(query, depth)]
+                ranked = reciprocal_rank_fusion(
+                    [list(similarity), lexical], k=self._rrf_k
+                )[:k]
+            results.append(
+                [
+                    {
+                        **self._docs[i],
+                        "similarity": similarity.get(i),
+                        "score": float(score),
+                    }
+                    for score, i in ranked
+                ]
+            )
+        return results
+
+
+_retriever: VectorStoreRetriever | None = None
+_retriever_pid: int | None = None
+_retriever_lock = threading.Lock()
 
 
-retriever = VectorStoreRetriever.from_docs(docs, client)
+def get_retriever() -> VectorStoreRetriever:
+    """Return the process-wide FAQ retriever, building it on first use."""
+    global _retriever, _retriever_pid
+    pid = os.getpid()
+    if _retriever is not None and _retriever_pid == pid:
+        return _retriever
+    with _retriever_lock:
+        if _retriever is None or _retriever_pid != pid:
+            embedder = create_embedding_provider()
+            _retriever = VectorStoreRetriever.from_docs(
+                load_faq_docs(),
+                embedder,
+                cache=EmbeddingCache(EMBEDDING_CACHE_DIR, embedder.name),
+            )
+            _retriever_pid = pid
+    return _retriever
 
 
 @tool
 def lookup_policy(query: str) -> str:
     """Consult the company policies to check whether certain options are permitted.
     Use this before making any flight changes performing other 'write' events."""
-    docs = retriever.query(query, k=2)
+    docs = get_retriever().query(query, k=2)
     return "\n\n".join([doc["page_content"] for doc in docs])
\ No newline at end of file
@@ -0,0 +1,154 @@
+import bisect
+import os
+import sqlite3
+import threading
+import time
+from datetime import date, datetime
+from typing import Optional, Union
+
+from db.changelog import CHANGELOG_TABLE
+from db.pool import get_pool
+
+
+# 两次检查变更日志的最小间隔（秒）
+ROUTE_INDEX_REFRESH_INTERVAL = float(os.environ.get("ROUTE_INDEX_REFRESH_INTERVAL", "1.0"))
+
+FLIGHT_COLUMNS = (
+    "flight_id",
+    "flight_no",
+    "departure_airport",
+    "arrival_airport",
+    "scheduled_departure",
+    "scheduled_arrival",
+)
+_SELECT_FLIGHTS = f"SELECT {', '.join(FLIGHT_COLUMNS)} FROM flights"
+
+
+def _sql_value(value: Union[datetime, date, str]) -> str:
+    # 与 sqlite3 默认适配器一致，保证比较语义和 SQL 查询相同
+    if isinstance(value, datetime):
+        return value.isoformat(" ")
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+
+class RouteIndex:
+    """In-memory index of flights by (departure_airport, arrival_airport).
+
+    Each route keeps its flights sorted by (scheduled_departure, flight_id),
+    so a time window or a keyset page is two bisects. The index follows the
+    `flights_changelog` table: changed flights are reloaded one by one, and
+    a rebuild marker or a gap in the log (pruned entries) triggers a full
+    rebuild.
+    """
+
+    def __init__(self, refresh_interval: float = ROUTE_INDEX_REFRESH_INTERVAL):
+        self.refresh_interval = refresh_interval
+        self._lock = threading.RLock()
+        self._routes: dict[tuple[str, str], list[tuple[str, int]]] = {}
+        self._flights: dict[int, dict] = {}
+        self._last_seq: Optional[int] = None
+        self._checked_at = float("-inf")
+
+    def _add(self, row: dict) -> None:
+        self._flights[row["flight_id"]] = row
+        keys = self._routes.setdefault((row["departure_airport"], row["arrival_airport"]), [])
+        bisect.insort(keys, (row["scheduled_departure"], row["flight_id"]))
+
+    def _remove(self, flight_id: int) -> None:
+        row = self._flights.pop(flight_id, None)
+        if row is None:
+            return
+        keys = self._routes.get((row["departure_airport"], row["arrival_airport"]), [])
+        key = (row["scheduled_departure"], flight_id)
+        i = bisect.bisect_left(keys, key)
+        if i < len(keys) and keys[i] == key:
+            del keys[i]
+
+    def _rebuild(self, conn: sqlite3.Connection, last_seq: int) -> None:
+        self._routes, self._flights = {}, {}
+        for row in conn.execute(f"{_SELECT_FLIGHTS} ORDER BY scheduled_departure, flight_id"):
+            row = dict(row)
+            self._flights[row["flight_id"]] = row
+            self._routes.setdefault((row["departure_airport"], row["arrival_airport"]), []).append(
+                (row["scheduled_departure"], row["flight_id"])
+            )
+        self._last_seq = last_seq
+
+    def refresh(self, conn: sqlite3.Connection, force: bool = False) -> None:
+        """Apply changes logged since the last refresh (throttled unless `force`)."""
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.refresh_interval:
+            return
+        with self._lock:
+            self._checked_at = now
+            head = conn.execute(f"SELECT MAX(seq) AS seq FROM {CHANGELOG_TABLE}").fetchone()["seq"] or 0
+            if self._last_seq is None:
+                self._rebuild(conn, head)
+                return
+            if head == self._last_seq:
+                return
+            changes = conn.execute(
+                f"SELECT seq, flight_id FROM {CHANGELOG_TABLE} WHERE seq > ? ORDER BY seq",
+                (self._last_seq,),
+            ).fetchall()
+            gap = not changes or changes[0]["seq"] != self._last_seq + 1
+            if gap or any(change["flight_id"] is None for change in changes):
+                self._rebuild(conn, head)
+                return
+            changed = sorted({change["flight_id"] for change in changes})
+            for flight_id in changed:
+                self._remove(flight_id)
+            for start in range(0, len(changed), 500):
+                batch = changed[start : start + 500]
+                placeholders = ", ".join("?" for _ in batch)
+                for row in conn.execute(
+                    f"{_SELECT_FLIGHTS} WHERE flight_id IN ({placeholders})", batch
+                ):
+                    self._add(dict(row))
+            self._last_seq = changes[-1]["seq"]
+
+    def search(
+        self,
+        departure_airport: str,
+        arrival_airport: str,
+        start_time: Union[datetime, date, str, None] = None,
+        end_time: Union[datetime, date, str, None] = None,
+        after: Optional[tuple[str, int]] = None,
+        limit: int = 20,
+    ) -> list[dict]:
+        """Flights on one route ordered by (scheduled_departure, flight_id).
+
+        Same semantics as the SQL query in `search_flights`: departure within
+        [start_time, end_time], strictly after the keyset position `after`.
+        """
+        with self._lock:
+            keys = self._routes.get((departure_airport, arrival_airport), [])
+            lo = bisect.bisect_left(keys, (_sql_value(start_time),)) if start_time else 0
+            if after is not None:
+                lo = max(lo, bisect.bisect_right(keys, tuple(after)))
+            if end_time:
+                # 起飞时间等于 end 的键都小于 (end, inf)，保证 scheduled_departure <= end
+                hi = bisect.bisect_right(keys, (_sql_value(end_time), float("inf")))
+            else:
+                hi = len(keys)
+            return [dict(self._flights[flight_id]) for _, flight_id in keys[lo : min(hi, lo + limit)]]
+
+
+_route_index: RouteIndex | None = None
+_route_index_pid: int | None = None
+_route_index_lock = threading.Lock()
+
+
+def get_route_index() -> RouteIndex:
+    """Return the process-wide route index, refreshed from the change log."""
+    global _route_index, _route_index_pid
+    pid = os.getpid()
+    if _route_index is None or _route_index_pid != pid:
+        with _route_index_lock:
+            if _route_index is None or _route_index_pid != pid:
+                _route_index, _route_index_pid = RouteIndex(), pid
+    with get_pool().read() as conn:
+        _route_index.refresh(conn)
+    return _route_index
@@ -0,0 +1,158 @@
+import sqlite3
+import sys
+
+
+# 覆盖索引：fetch_user_flight_information 的 tickets -> ticket_flights -> boarding_passes
+# 连接链路，以及 search_flights 按航线 + 起飞时间的范围查询
+INDEXES = {
+    "idx_tickets_passenger": "tickets (passenger_id, ticket_no, book_ref)",
+    "idx_ticket_flights_ticket": "ticket_flights (ticket_no, flight_id, fare_conditions)",
+    "idx_boarding_passes_ticket_flight": "boarding_passes (ticket_no, flight_id, seat_no)",
+    "idx_flights_flight_id": "flights (flight_id)",
+    # search_flights 不限航线时的键集分页 (scheduled_departure, flight_id)
+    "idx_flights_departure_keyset": "flights (scheduled_departure, flight_id)",
+    "idx_flights_route_departure": (
+        "flights (departure_airport, arrival_airport, scheduled_departure,"
+        " flight_id, flight_no, scheduled_arrival)"
+    ),
+}
+
+# 早期版本建过、但查询用不上的索引：地点走全文检索/LIKE，可用性条件是 NOT (...)
+# 形式且多数行未预订，hotels/car_rentals 又很小，全表扫描更合适；只增加写入开销
+OBSOLETE_INDEXES = (
+    "idx_hotels_location_tier",
+    "idx_hotels_booked_dates",
+    "idx_car_rentals_location_tier",
+    "idx_car_rentals_booked_dates",
+)
+
+# 用于生成查询计划报告的代表性查询
+ACCESS_PATHS = {
+    "fetch_user_flight_information": (
+        """
+        SELECT
+            t.ticket_no, t.book_ref,
+            f.flight_id, f.flight_no, f.departure_airport, f.arrival_airport,
+            f.scheduled_departure, f.scheduled_arrival,
+            bp.seat_no, tf.fare_conditions
+        FROM tickets t
+        JOIN ticket_flights tf ON t.ticket_no = tf.ticket_no
+        JOIN flights f ON tf.flight_id = f.flight_id
+        JOIN boarding_passes bp ON bp.ticket_no = t.ticket_no
+            AND bp.flight_id = f.flight_id
+        WHERE t.passenger_id = ?
+        LIMIT 100
+        """,
+        ("0000 000001",),
+    ),
+    "search_flights": (
+        """
+        SELECT
+            flight_id, flight_no,
+            departure_airport, arrival_airport,
+            scheduled_departure, scheduled_arrival
+        FROM flights
+        WHERE departure_airport = ? AND arrival_airport = ?
+            AND scheduled_departure >= ? AND scheduled_departure <= ?
+            AND (scheduled_departure, flight_id) > (?, ?)
+        ORDER BY scheduled_departure, flight_id
+        LIMIT 21
+        """,
+        ("BSL", "CDG", "2024-01-01", "2030-01-01", "2024-01-01", 0),
+    ),
+    "search_flights_any_route": (
+        """
+        SELECT
+            flight_id, flight_no,
+            departure_airport, arrival_airport,
+            scheduled_departure, scheduled_arrival
+        FROM flights
+        WHERE scheduled_departure >= ?
+            AND (scheduled_departure, flight_id) > (?, ?)
+        ORDER BY scheduled_departure, flight_id
+        LIMIT 21
+        """,
+        ("2024-01-01", "2024-01-01", 0),
+    ),
+    "search_hotels": (
+        """
+        SELECT id, name, location, price_tier, checkin_date, checkout_date, booked
+        FROM hotels
+        WHERE NOT (booked = 1 AND checkin_date < ? AND checkout_date >= ?)
+            AND price_tier = ? COLLATE NOCASE
+            AND location LIKE ?
+        ORDER BY booked, id
+        LIMIT 20
+        """,
+        ("2024-04-09", "2024-04-03", "Luxury", "%Zurich%"),
+    ),
+}
+
+
+def _existing_indexes(conn: sqlite3.Connection) -> set[str]:
+    rows = conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'index'"
+    ).fetchall()
+    return {row[0] for row in rows}
+
+
+def explain_plan(conn: sqlite3.Connection, sql: str, params=()) -> list[str]:
+    """Return the `EXPLAIN QUERY PLAN` detail lines for `sql`."""
+    rows = conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+    return [row[-1] for row in rows]
+
+
+def query_plans(conn: sqlite3.Connection) -> dict[str, list[str]]:
+    return {
+        name: explain_plan(conn, sql, params)
+        for name, (sql, params) in ACCESS_PATHS.items()
+    }
+
+
+def optimize_schema(conn: sqlite3.Connection, report: bool = False):
+    """Create the secondary indexes the tools rely on and refresh statistics.
+
+    Safe to call on every start: when all indexes already exist nothing is
+    written. Indexes listed in `OBSOLETE_INDEXES` are dropped. Runs in the
+    caller's transaction, if any. With `report=True` returns `{query: {"before": plan, "after": plan}}`
+    for the queries in `ACCESS_PATHS`, otherwise the list of created indexes.
+    """
+    before = query_plans(conn) if report else None
+    existing = _existing_indexes(conn)
+    missing = {
+        name: target
+        for name, target in INDEXES.items()
+        if name not in existing
+    }
+    for name in OBSOLETE_INDEXES:
+        if name in existing:
+            conn.execute(f"DROP INDEX {name}")
+    if missing:
+        for name, target in missing.items():
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {target}")
+        conn.execute("ANALYZE")
+    if not report:
+        return list(missing)
+    after = query_plans(conn)
+    return {name: {"before": before[name], "after": after[name]} for name in after}
+
+
+def format_plan_report(report: dict) -> str:
+    lines = []
+    for name, plans in report.items():
+        lines.append(f"== {name}")
+        for stage in ("before", "after"):
+            lines.append(f"  {stage}:")
+            lines.extend(f"    {detail}" for detail in plans[stage])
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    # python -m db.schema [travel2.sqlite]
+    from db.db import local_file
+
+    conn = sqlite3.connect(sys.argv[1] if len(sys.argv) > 1 else local_file)
+    try:
+        print(format_plan_report(optimize_schema(conn, report=True)))
+    finally:
+        conn.close()
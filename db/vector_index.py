@@ -0,0 +1,123 @@
+import math
+from typing import Protocol
+
+import numpy as np
+
+
+# 文档数超过该阈值时 "auto" 后端切换为 IVF 近似索引
+IVF_THRESHOLD = 10_000
+
+
+def normalize_rows(vectors) -> np.ndarray:
+    """Return `vectors` as a C-contiguous float32 matrix with unit-length rows."""
+    matrix = np.array(vectors, dtype=np.float32, ndmin=2, order="C", copy=True)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix /= norms
+    return matrix
+
+
+def _top_k(scores: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+    """Indices and scores of the `k` largest entries of a 1-D array, best first."""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int64)
+    idx = np.argpartition(scores, -k)[-k:]
+    idx = idx[np.argsort(-scores[idx])]
+    return scores[idx], idx
+
+
+class VectorIndex(Protocol):
+    """Cosine-similarity search over unit-length float32 vectors."""
+
+    def __len__(self) -> int: ...
+
+    def search(self, queries: np.ndarray, k: int) -> list[tuple[np.ndarray, np.ndarray]]:
+        """Return `(scores, ids)` per query row, best first."""
+        ...
+
+
+class BruteForceIndex:
+    """Exact search with a single matrix product; right for small corpora."""
+
+    def __init__(self, vectors):
+        self.vectors = normalize_rows(vectors)
+
+    def __len__(self) -> int:
+        return len(self.vectors)
+
+    def search(self, queries: np.ndarray, k: int) -> list[tuple[np.ndarray, np.ndarray]]:
+        scores = queries @ self.vectors.T # 矩阵乘法计算相似度
+        return [_top_k(row, k) for row in scores]
+
+
+class IVFIndex:
+    """Inverted-file approximate index.
+
+    Vectors are clustered with spherical k-means into `n_lists` cells; a query
+    only scores the vectors of its `n_probe` closest cells.
+    """
+
+    def __init__(
+        self,
+        vectors,
+        n_lists: int | None = None,
+        n_probe: int = 16,
+        n_iter: int = 10,
+        seed: int = 0,
+    ):
+        self.vectors = normalize_rows(vectors)
+        n = len(self.vectors)
+        self.n_lists = max(1, min(n, n_lists or int(math.sqrt(n))))
+        self.n_probe = min(n_probe, self.n_lists)
+        self.centroids = self._train(n_iter, seed)
+        assignments = self._assign(self.vectors)
+        order = np.argsort(assignments, kind="stable")
+        bounds = np.searchsorted(assignments[order], np.arange(self.n_lists + 1))
+        self._lists = [order[bounds[i] : bounds[i + 1]] for i in range(self.n_lists)]
+
+    def __len__(self) -> int:
+        return len(self.vectors)
+
+    def _train(self, n_iter: int, seed: int) -> np.ndarray:
+        rng = np.random.default_rng(seed)
+        n = len(self.vectors)
+        sample = self.vectors[rng.choice(n, size=min(n, self.n_lists * 64), replace=False)]
+        centroids = sample[rng.choice(len(sample), size=self.n_lists, replace=False)].copy()
+        for _ in range(n_iter):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, sample)
+            counts = np.bincount(assign, minlength=self.n_lists)
+            # 空簇保留原中心
+            sums[counts == 0] = centroids[counts == 0]
+            centroids = normalize_rows(sums)
+        return centroids
+
+    def _assign(self, vectors: np.ndarray, chunk: int = 8192) -> np.ndarray:
+        return np.concatenate(
+            [
+                np.argmax(vectors[i : i + chunk] @ self.centroids.T, axis=1)
+                for i in range(0, len(vectors), chunk)
+            ]
+        )
+
+    def search(self, queries: np.ndarray, k: int) -> list[tuple[np.ndarray, np.ndarray]]:
+        probes = np.argsort(-(queries @ self.centroids.T), axis=1)[:, : self.n_probe]
+        results = []
+        for query, cells in zip(queries, probes):
+            candidates = np.concatenate([self._lists[c] for c in cells])
+            scores, idx = _top_k(self.vectors[candidates] @ query, k)
+            results.append((scores, candidates[idx]))
+        return results
+
+
+def build_index(vectors, backend: str = "auto", **kwargs) -> VectorIndex:
+    """Build a vector index; `backend` is "auto", "brute" or "ivf"."""
+    if backend == "auto":
+        backend = "ivf" if len(vectors) >= IVF_THRESHOLD else "brute"
+    if backend == "brute":
+        return BruteForceIndex(vectors)
+    if backend == "ivf":
+        return IVFIndex(vectors, **kwargs)
+    raise ValueError(f"Unknown vector index backend: {backend}")
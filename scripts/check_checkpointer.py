@@ -0,0 +1,90 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from typing import TypedDict
+
+from langgraph.graph import END, START, StateGraph
+
+from db.checkpointer import DurableSqliteSaver
+
+
+class _State(TypedDict):
+    x: int
+
+
+def _increment(state: _State) -> dict:
+    return {"x": state["x"] + 1}
+
+
+def _fail(state: _State) -> dict:
+    raise RuntimeError("LLM endpoint down")
+
+
+def _graph(saver: DurableSqliteSaver, fail: bool):
+    builder = StateGraph(_State)
+    builder.add_node("increment", _increment)
+    builder.add_edge(START, "increment")
+    if fail:
+        builder.add_node("fail", _fail)
+        builder.add_edge("increment", "fail")
+        builder.add_edge("fail", END)
+    else:
+        builder.add_edge("increment", END)
+    return builder.compile(checkpointer=saver)
+
+
+def _other_writer_ok(path: str) -> bool:
+    conn = sqlite3.connect(path, timeout=0.2)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("ROLLBACK")
+        return True
+    except sqlite3.OperationalError:
+        return False
+    finally:
+        conn.close()
+
+
+def check_checkpointer(directory: str) -> dict:
+    """Run a failing graph, a successful one and a dangling write against
+    one saver; the file must never stay locked afterwards."""
+    path = os.path.join(directory, "checkpoints.sqlite")
+    saver = DurableSqliteSaver.from_path(path, max_defer_seconds=0.2)
+    report = {}
+
+    try:
+        _graph(saver, fail=True).invoke({"x": 1}, {"configurable": {"thread_id": "failed"}})
+    except RuntimeError:
+        pass
+    report["failed_run_open_transaction"] = saver.conn.in_transaction
+    report["failed_run_other_writer_ok"] = _other_writer_ok(path)
+    conn = sqlite3.connect(path)
+    report["failed_run_error_saved"] = conn.execute(
+        "SELECT COUNT(*) FROM writes WHERE thread_id = 'failed' AND channel = '__error__'"
+    ).fetchone()[0] == 1
+    conn.close()
+
+    _graph(saver, fail=False).invoke({"x": 1}, {"configurable": {"thread_id": "ok"}})
+    report["ok_run_open_transaction"] = saver.conn.in_transaction
+
+    # 没有后续 checkpoint 的普通写入（例如运行被取消），超时后也会提交
+    config = {"configurable": {"thread_id": "ok", "checkpoint_ns": "", "checkpoint_id": "x"}}
+    saver.put_writes(config, [("x", 2)], task_id="dangling")
+    time.sleep(saver.max_defer_seconds * 3)
+    report["dangling_write_open_transaction"] = saver.conn.in_transaction
+    report["dangling_write_other_writer_ok"] = _other_writer_ok(path)
+    saver.conn.close()
+    return report
+
+
+if __name__ == "__main__":
+    # python -m scripts.check_checkpointer：失败/取消的运行不能让 checkpoints.sqlite 保持锁定
+    with tempfile.TemporaryDirectory() as directory:
+        report = check_checkpointer(directory)
+    for name, value in report.items():
+        print(f"{name}: {value}")
+    expected_true = [name for name in report if name.endswith(("_ok", "_saved"))]
+    failed = [name for name in report if report[name] != (name in expected_true)]
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,100 @@
+import json
+import random
+import sqlite3
+import sys
+import time
+from typing import Mapping, Sequence
+
+from db.fts import TextSearch, install_fts, text_search
+from db.pool import dict_factory
+from tools.shaping import search_table
+
+
+def _like_search(terms: Mapping[str, Sequence[str]]) -> TextSearch:
+    search = TextSearch()
+    for column, alternatives in terms.items():
+        search.where.append("(" + " OR ".join(f"{column} LIKE ?" for _ in alternatives) + ")")
+        search.params.extend(f"%{a}%" for a in alternatives)
+    return search
+
+
+def _synthetic_hotels(conn: sqlite3.Connection, rows: int, rng) -> list[str]:
+    stems = ["Zur", "Bas", "Gen", "Luz", "Ber", "Lau", "Lug", "Chur", "Sion", "Thun", "Aarau", "Olten"]
+    suffixes = ["ich", "el", "eva", "ern", "ano", "sanne", "wil", "dorf", "berg", "see", ""]
+    cities = [f"{stem}{suffix}" for stem in stems for suffix in suffixes]
+    words = ["Grand", "Park", "Hotel", "Inn", "Suites", "Lodge", "Palace", "Royal", "Alpine",
+             "Lake", "View", "Garden", "Central", "Plaza", "Resort", "Hilton", "Marriott", "Hyatt"]
+    conn.execute(
+        "CREATE TABLE hotels (id INTEGER PRIMARY KEY, name TEXT, location TEXT, "
+        "price_tier TEXT, checkin_date TEXT, checkout_date TEXT, booked INTEGER)"
+    )
+    conn.executemany(
+        "INSERT INTO hotels (name, location, price_tier, checkin_date, checkout_date, booked) "
+        "VALUES (?, ?, 'Midscale', '2024-04-02', '2024-04-09', ?)",
+        (
+            (" ".join(rng.sample(words, 3)), rng.choice(cities), rng.random() < 0.3)
+            for _ in range(rows)
+        ),
+    )
+    return cities + words
+
+
+def _search_ids(conn: sqlite3.Connection, search: TextSearch, limit: int) -> list[int]:
+    # 与工具完全相同的查询：search_table 的窗口函数计总数、按可用性 + bm25 排序
+    result = search_table(conn, "hotels", {"id": "id"}, text=search, limit=limit)
+    return [row[0] for row in result["rows"]]
+
+
+def check_against_like(rows: int = 300_000, queries: int = 200, seed: int = 0) -> dict:
+    """Compare `text_search` (FTS5 trigram) with plain LIKE on synthetic hotels.
+
+    Builds an in-memory `hotels` table of `rows` rows, installs the FTS
+    index and runs random substring searches (mixed case, alternatives,
+    terms too short for the trigram index) and whole-city location searches
+    both ways. Every search must match the same rows; the timings are for
+    the tools' page of 20 rows with the total count.
+    """
+    rng = random.Random(seed)
+    conn = sqlite3.connect(":memory:")
+    conn.row_factory = dict_factory
+    vocabulary = _synthetic_hotels(conn, rows, rng)
+    if not install_fts(conn):
+        raise RuntimeError("FTS5 with the trigram tokenizer is not available")
+
+    def term():
+        word = rng.choice(vocabulary)
+        start = rng.randrange(len(word))
+        piece = word[start : start + rng.randint(2, 6)]
+        return piece.upper() if rng.random() < 0.3 else piece
+
+    cities = vocabulary[: vocabulary.index("Grand")]
+    report = {"rows": rows, "queries": queries, "mismatches": 0}
+    timings = {"substring": [0.0, 0.0, 0], "location": [0.0, 0.0, 0]}
+    for i in range(queries):
+        if i % 2:
+            # 按城市名搜索（工具最常见的用法），命中的行较少
+            kind, terms = "location", {"location": [rng.choice(cities)]}
+        else:
+            kind, terms = "substring", {"location": [term() for _ in range(rng.randint(1, 2))]}
+            if rng.random() < 0.5:
+                terms["name"] = [term()]
+        fts, like = text_search(conn, "hotels", terms), _like_search(terms)
+        if sorted(_search_ids(conn, fts, -1)) != sorted(_search_ids(conn, like, -1)):
+            report["mismatches"] += 1
+        for slot, search in enumerate((fts, like)):
+            started = time.perf_counter()
+            _search_ids(conn, search, 20)
+            timings[kind][slot] += time.perf_counter() - started
+        timings[kind][2] += 1
+    conn.close()
+    for kind, (fts_time, like_time, count) in timings.items():
+        report[f"{kind}_fts_ms"] = round(fts_time / max(count, 1) * 1000, 2)
+        report[f"{kind}_like_ms"] = round(like_time / max(count, 1) * 1000, 2)
+    return report
+
+
+if __name__ == "__main__":
+    # python -m scripts.check_fts [rows]：核对全文检索与 LIKE 结果一致并比较耗时
+    report = check_against_like(int(sys.argv[1]) if len(sys.argv) > 1 else 300_000)
+    print(json.dumps(report, indent=2))
+    sys.exit(1 if report["mismatches"] else 0)
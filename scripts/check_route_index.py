@@ -0,0 +1,170 @@
+import json
+import random
+import sqlite3
+import sys
+import time
+from datetime import datetime
+
+from db.changelog import install_route_changelog
+from db.db import local_file
+from db.pool import dict_factory
+from db.route_index import FLIGHT_COLUMNS, RouteIndex
+
+_SELECT = f"SELECT {', '.join(FLIGHT_COLUMNS)} FROM flights"
+
+
+def _sql_search(conn, departure_airport, arrival_airport, start_time, end_time, after, limit):
+    # 与 search_flights 中指定航线时的 SQL 查询相同，作为对照
+    query = f"{_SELECT} WHERE departure_airport = ? AND arrival_airport = ?"
+    params = [departure_airport, arrival_airport]
+    if start_time:
+        query += " AND scheduled_departure >= ?"
+        params.append(start_time)
+    if end_time:
+        query += " AND scheduled_departure <= ?"
+        params.append(end_time)
+    if after:
+        query += " AND (scheduled_departure, flight_id) > (?, ?)"
+        params.extend(after)
+    query += " ORDER BY scheduled_departure, flight_id LIMIT ?"
+    return [dict(row) for row in conn.execute(query, [*params, limit])]
+
+
+def _random_queries(conn, rng, count):
+    keys = [
+        (row["departure_airport"], row["arrival_airport"], row["scheduled_departure"], row["flight_id"])
+        for row in conn.execute(_SELECT)
+    ]
+    queries = []
+    for _ in range(count):
+        dep, arr, departure, flight_id = rng.choice(keys)
+        if rng.random() < 0.05:
+            arr = "XXX"  # 不存在的航线
+
+        def bound():
+            return rng.choice([
+                None,
+                departure,  # 恰好等于某个起飞时间
+                rng.choice(keys)[2],
+                datetime.fromisoformat(rng.choice(keys)[2]),
+                datetime.fromisoformat(rng.choice(keys)[2]).date(),
+            ])
+
+        after = rng.choice([
+            None,
+            (departure, flight_id),  # 恰好指向一行
+            (departure, 0),
+            (departure, 10**9),
+            (rng.choice(keys)[2], rng.choice(keys)[3]),
+        ])
+        queries.append((dep, arr, bound(), bound(), after, rng.randint(1, 25)))
+    return queries
+
+
+def _compare(conn, index, queries):
+    mismatches = []
+    for query in queries:
+        expected = _sql_search(conn, *query)
+        if index.search(*query) != expected:
+            mismatches.append(query)
+    return mismatches
+
+
+def _compare_pages(conn, index, routes, page_size=7):
+    # 用游标翻完整条航线，结果应与一次性的 SQL 查询一致
+    mismatches = []
+    for dep, arr in routes:
+        pages, after = [], None
+        while True:
+            page = index.search(dep, arr, after=after, limit=page_size)
+            pages.extend(page)
+            if len(page) < page_size:
+                break
+            after = (page[-1]["scheduled_departure"], page[-1]["flight_id"])
+        if pages != _sql_search(conn, dep, arr, None, None, None, -1):
+            mismatches.append((dep, arr))
+    return mismatches
+
+
+def _mutate_flights(conn, rng, count):
+    ids = [row["flight_id"] for row in conn.execute("SELECT flight_id FROM flights")]
+    airports = [row["departure_airport"] for row in conn.execute(
+        "SELECT DISTINCT departure_airport FROM flights"
+    )]
+    for flight_id in rng.sample(ids, min(count, len(ids))):
+        action = rng.random()
+        if action < 0.6:
+            conn.execute(
+                "UPDATE flights SET scheduled_departure = "
+                "(SELECT scheduled_departure FROM flights ORDER BY random() LIMIT 1) "
+                "WHERE flight_id = ?",
+                (flight_id,),
+            )
+        elif action < 0.8:
+            conn.execute(
+                "UPDATE flights SET arrival_airport = ? WHERE flight_id = ?",
+                (rng.choice(airports), flight_id),
+            )
+        else:
+            conn.execute("DELETE FROM flights WHERE flight_id = ?", (flight_id,))
+
+
+def check_against_sql(conn: sqlite3.Connection, queries: int = 2000, seed: int = 0) -> dict:
+    """Compare `RouteIndex.search` with the equivalent SQL on random queries.
+
+    Covers bounds and cursors that hit existing keys exactly, date-only
+    bounds, paging through whole routes, and an incremental refresh after
+    flights were updated, moved to another route or deleted. The changes
+    are rolled back. Returns mismatch counts and per-query timings.
+    """
+    rng = random.Random(seed)
+    index = RouteIndex(refresh_interval=0)
+    conn.execute("BEGIN")
+    try:
+        install_route_changelog(conn)
+        index.refresh(conn, force=True)
+        sample = _random_queries(conn, rng, queries)
+
+        started = time.perf_counter()
+        for query in sample:
+            index.search(*query)
+        index_us = (time.perf_counter() - started) / len(sample) * 1e6
+        started = time.perf_counter()
+        for query in sample:
+            _sql_search(conn, *query)
+        sql_us = (time.perf_counter() - started) / len(sample) * 1e6
+
+        routes = [
+            (row["departure_airport"], row["arrival_airport"])
+            for row in conn.execute(
+                "SELECT DISTINCT departure_airport, arrival_airport FROM flights"
+            )
+        ]
+        routes = rng.sample(routes, min(len(routes), 200))
+        report = {
+            "queries": len(sample),
+            "mismatches": len(_compare(conn, index, sample)),
+            "paged_routes": len(routes),
+            "paging_mismatches": len(_compare_pages(conn, index, routes)),
+            "index_us_per_query": round(index_us, 1),
+            "sql_us_per_query": round(sql_us, 1),
+        }
+        _mutate_flights(conn, rng, 200)
+        index.refresh(conn, force=True)
+        report["mismatches_after_refresh"] = len(_compare(conn, index, _random_queries(conn, rng, queries)))
+    finally:
+        conn.execute("ROLLBACK")
+    return report
+
+
+if __name__ == "__main__":
+    # python -m scripts.check_route_index [travel2.sqlite]：核对内存索引与 SQL 查询结果一致
+    conn = sqlite3.connect(sys.argv[1] if len(sys.argv) > 1 else local_file, isolation_level=None)
+    conn.row_factory = dict_factory
+    try:
+        report = check_against_sql(conn)
+    finally:
+        conn.close()
+    print(json.dumps(report, indent=2))
+    failed = report["mismatches"] + report["paging_mismatches"] + report["mismatches_after_refresh"]
+    sys.exit(1 if failed else 0)
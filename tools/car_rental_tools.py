@@ -1,10 +1,21 @@
-import sqlite3
 from datetime import date, datetime
 from typing import Optional, Union
 from langchain_core.tools import tool
-from db.db import db
+from db.fts import text_search
+from db.pool import get_pool, update_returning
+from tools.shaping import availability_filter, search_table, with_row_limit
+from tools.utilities_tools import with_async_variant
 
 
+# 返回给 LLM 的列；未预订的排在前面
+CAR_RENTAL_COLUMNS = {
+    column: column
+    for column in ("id", "name", "location", "price_tier", "start_date", "end_date", "booked")
+}
+
+
+@with_async_variant
+@with_row_limit
 @tool
 def search_car_rentals(
     location: Optional[str] = None,
@@ -12,7 +23,7 @@ def search_car_rentals(
     price_tier: Optional[str] = None,
     start_date: Optional[Union[datetime, date]] = None,
     end_date: Optional[Union[datetime, date]] = None,
-) -> list[dict]:
+) -> dict:
     """
     Search for car rentals based on location, name, price tier, start date, and end date.
 
@@ -24,33 +35,22 @@ def search_car_rentals(
         end_date (Optional[Union[datetime, date]]): The end date of the car rental. Defaults to None.
 
     Returns:
-        list[dict]: A list of car rental dictionaries matching the search criteria.
+        dict: Matching car rentals as {"columns", "rows", "total", "truncated"}; unbooked rentals first,
+        at most {row_limit} rows. Narrow the search if "truncated" is true.
+        Entries already booked for dates overlapping the requested ones are left out.
     """
-    base_query = "SELECT * FROM car_rentals WHERE 1=1"
-    params = []
+    # 已被预订且时间段与所需日期重叠的记录不可用
+    where, params = availability_filter("start_date", "end_date", start_date, end_date)
+    if price_tier:
+        where.append("price_tier = ? COLLATE NOCASE")
+        params.append(price_tier.strip())
 
-    conditions = {
-        "location": (location, "location LIKE ?"),
-        "name": (name, "name LIKE ?"),
-    }
-    
-    for value, condition in conditions.values():
-        if value:
-            base_query += f" AND {condition}"
-            params.append(f"%{value}%")
-    
-    with sqlite3.connect(db) as conn:
-        cursor = conn.cursor()
-        # For our tutorial, we will let you match on any dates and price tier.
-        # (since our toy dataset doesn't have much data)
-        cursor.execute(base_query, params)
-        results = [
-            dict(zip([column[0] for column in cursor.description], row)) for row in cursor.fetchall()
-        ]
-        cursor.close()
-        return results
+    with get_pool().read() as conn:
+        text = text_search(conn, "car_rentals", {"location": [location], "name": [name]})
+        return search_table(conn, "car_rentals", CAR_RENTAL_COLUMNS, where, params, text=text)
 
 
+@with_async_variant
 @tool
 def book_car_rental(rental_id: int) -> str:
     """
@@ -62,20 +62,16 @@ def book_car_rental(rental_id: int) -> str:
     Returns:
         str: A message indicating whether the car rental was successfully booked or not.
     """
-    with sqlite3.connect(db) as conn:
-        cursor = conn.cursor()
-
-        cursor.execute("UPDATE car_rentals SET booked = 1 WHERE id = ?", (rental_id,))
-        conn.commit()
+    with get_pool().write() as conn:
+        cursor = conn.execute("UPDATE car_rentals SET booked = 1 WHERE id = ?", (rental_id,))
 
-        if cursor.rowcount > 0:
-            cursor.close()
-            return f"Car rental {rental_id} successfully booked."
-        else:
-            cursor.close()
-            return f"No car rental found with ID {rental_id}."
+    if cursor.rowcount > 0:
+        return f"Car rental {rental_id} successfully booked."
+    else:
+        return f"No car rental found with ID {rental_id}."
 
 
+@with_async_variant
 @tool
 def update_car_rental(
     rental_id: int,
@@ -93,36 +89,27 @@ def update_car_rental(
     Returns:
         str: A message indicating whether the car rental was successfully updated or not.
     """
-    # base_query = "SELECT * FROM car_rentals WHERE 1=1"
-    # params = []
-
-    # conditions = {
-    #     "location": (location, "location LIKE ?"),
-    #     "name": (name, "name LIKE ?"),
-    # }
-    with sqlite3.connect(db) as conn:
-        cursor = conn.cursor()
-
-        if start_date:
-            cursor.execute(
-                "UPDATE car_rentals SET start_date = ? WHERE id = ?",
-                (start_date, rental_id),
-            )
-        if end_date:
-            cursor.execute(
-                "UPDATE car_rentals SET end_date = ? WHERE id = ?", (end_date, rental_id)
-            )
-
-        conn.commit()
-
-        if cursor.rowcount > 0:
-            cursor.close()
-            return f"Car rental {rental_id} successfully updated."
-        else:
-            cursor.close()
-            return f"No car rental found with ID {rental_id}."
+    values = {
+        column: value
+        for column, value in (("start_date", start_date), ("end_date", end_date))
+        if value
+    }
+    if not values:
+        return f"No new dates given for car rental {rental_id}; nothing was changed."
+
+    # 一条 UPDATE 写入所有字段，并直接返回写入后的记录
+    with get_pool().write() as conn:
+        row = update_returning(conn, "car_rentals", rental_id, values)
 
+    if row is None:
+        return f"No car rental found with ID {rental_id}."
+    return (
+        f"Car rental {rental_id} successfully updated. "
+        f"Start: {row['start_date']}, end: {row['end_date']}."
+    )
 
+
+@with_async_variant
 @tool
 def cancel_car_rental(rental_id: int) -> str:
     """
@@ -134,15 +121,10 @@ def cancel_car_rental(rental_id: int) -> str:
     Returns:
         str: A message indicating whether the car rental was successfully cancelled or not.
     """
-    with sqlite3.connect(db) as conn:
-        cursor = conn.cursor()
-
-        cursor.execute("UPDATE car_rentals SET booked = 0 WHERE id = ?", (rental_id,))
-        conn.commit()
-
-        if cursor.rowcount > 0:
-            cursor.close()
-            return f"Car rental {rental_id} successfully cancelled."
-        else:
-            cursor.close()
-            return f"No car rental found with ID {rental_id}."
\ No newline at end of file
+    with get_pool().write() as conn:
+        cursor = conn.execute("UPDATE car_rentals SET booked = 0 WHERE id = ?", (rental_id,))
+
+    if cursor.rowcount > 0:
+        return f"Car rental {rental_id} successfully cancelled."
+    else:
+        return f"No car rental found with ID {rental_id}."
\ No newline at end of file
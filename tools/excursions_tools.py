@@ -1,15 +1,31 @@
-import sqlite3
 from typing import Optional
 from langchain_core.tools import tool
-from db.db import db
-
-
+from db.fts import text_search
+from db.pool import get_pool
+from tools.shaping import search_table, with_row_limit
+from tools.utilities_tools import with_async_variant
+
+
+# 返回给 LLM 的列；details 截断为摘要
+TRIP_DETAILS_CHARS = 200
+TRIP_COLUMNS = {
+    "id": "id",
+    "name": "name",
+    "location": "location",
+    "keywords": "keywords",
+    "details": f"substr(details, 1, {TRIP_DETAILS_CHARS})",
+    "booked": "booked",
+}
+
+
+@with_async_variant
+@with_row_limit
 @tool
 def search_trip_recommendations(
     location: Optional[str] = None,
     name: Optional[str] = None,
     keywords: Optional[str] = None,
-) -> list[dict]:
+) -> dict:
     """
     Search for trip recommendations based on location, name, and keywords.
 
@@ -19,43 +35,21 @@ def search_trip_recommendations(
         keywords (Optional[str]): The keywords associated with the trip recommendation. Defaults to None.
 
     Returns:
-        list[dict]: A list of trip recommendation dictionaries matching the search criteria.
+        dict: Matching trip recommendations as {"columns", "rows", "total", "truncated"}, best keyword
+        matches first, at most {row_limit} rows. Narrow the search if "truncated" is true.
     """
-    base_query = "SELECT * FROM trip_recommendations WHERE 1=1"
-    params = []
-
-    # 定义条件模板
-    conditions = {
-        "location": (location, "location LIKE ?"),
-        "name": (name, "name LIKE ?"),
-    }
-
-    # 处理普通条件
-    for value, condition_template in conditions.values():
-        if value:
-            base_query += f" AND {condition_template}"
-            params.append(f"%{value}%")  # 注意这里改为value而不是name
-
-    # 处理特殊的关键词条件
-    if keywords:
-        keyword_list = [k.strip() for k in keywords.split(",")]
-        keyword_conditions = " OR ".join(["keywords LIKE ?" for _ in keyword_list])
-        base_query += f" AND ({keyword_conditions})"
-        params.extend([f"%{keyword}%" for keyword in keyword_list])
-
-    with sqlite3.connect(db) as conn:
-        cursor = conn.cursor()
-        cursor.execute(base_query, params)
-
-        results = [
-            dict(zip([column[0] for column in cursor.description], row)) for row in cursor.fetchall()
-        ]
-
-        cursor.close()
-
-        return results
+    keyword_list = [k.strip() for k in keywords.split(",")] if keywords else None
+    with get_pool().read() as conn:
+        # 名称/地点/关键词走全文索引；任一关键词命中即可，按 bm25 排序
+        text = text_search(
+            conn,
+            "trip_recommendations",
+            {"location": [location], "name": [name], "keywords": keyword_list},
+        )
+        return search_table(conn, "trip_recommendations", TRIP_COLUMNS, text=text)
 
 
+@with_async_variant
 @tool
 def book_excursion(recommendation_id: int) -> str:
     """
@@ -67,22 +61,18 @@ def book_excursion(recommendation_id: int) -> str:
     Returns:
         str: A message indicating whether the trip recommendation was successfully booked or not.
     """
-    with sqlite3.connect(db) as conn:
-        cursor = conn.cursor()
-
-        cursor.execute(
+    with get_pool().write() as conn:
+        cursor = conn.execute(
             "UPDATE trip_recommendations SET booked = 1 WHERE id = ?", (recommendation_id,)
         )
-        conn.commit()
 
-        if cursor.rowcount > 0:
-            cursor.close()
-            return f"Trip recommendation {recommendation_id} successfully booked."
-        else:
-            cursor.close()
-            return f"No trip recommendation found with ID {recommendation_id}."
+    if cursor.rowcount > 0:
+        return f"Trip recommendation {recommendation_id} successfully booked."
+    else:
+        return f"No trip recommendation found with ID {recommendation_id}."
 
 
+@with_async_variant
 @tool
 def update_excursion(recommendation_id: int, details: str) -> str:
     """
@@ -95,23 +85,19 @@ def update_excursion(recommendation_id: int, details: str) -> str:
     Returns:
         str: A message indicating whether the trip recommendation was successfully updated or not.
     """
-    with sqlite3.connect(db) as conn:
-        cursor = conn.cursor()
-
-        cursor.execute(
+    with get_pool().write() as conn:
+        cursor = conn.execute(
             "UPDATE trip_recommendations SET details = ? WHERE id = ?",
             (details, recommendation_id),
         )
-        conn.commit()
 
-        if cursor.rowcount > 0:
-            cursor.close()
-            return f"Trip recommendation {recommendation_id} successfully updated."
-        else:
-            cursor.close()
-            return f"No trip recommendation found with ID {recommendation_id}."
+    if cursor.rowcount > 0:
+        return f"Trip recommendation {recommendation_id} successfully updated."
+    else:
+        return f"No trip recommendation found with ID {recommendation_id}."
 
 
+@with_async_variant
 @tool
 def cancel_excursion(recommendation_id: int) -> str:
     """
@@ -123,17 +109,12 @@ def cancel_excursion(recommendation_id: int) -> str:
     Returns:
         str: A message indicating whether the trip recommendation was successfully cancelled or not.
     """
-    with sqlite3.connect(db) as conn:
-        cursor = conn.cursor()
-
-        cursor.execute(
+    with get_pool().write() as conn:
+        cursor = conn.execute(
             "UPDATE trip_recommendations SET booked = 0 WHERE id = ?", (recommendation_id,)
         )
-        conn.commit()
-
-        if cursor.rowcount > 0:
-            cursor.close()
-            return f"Trip recommendation {recommendation_id} successfully cancelled."
-        else:
-            cursor.close()
-            return f"No trip recommendation found with ID {recommendation_id}."
\ No newline at end of file
+
+    if cursor.rowcount > 0:
+        return f"Trip recommendation {recommendation_id} successfully cancelled."
+    else:
+        return f"No trip recommendation found with ID {recommendation_id}."
@@ -1,30 +1,42 @@
-import sqlite3
-from datetime import date, datetime
-from typing import Union
+import base64
+import json
+from datetime import date, datetime, timedelta
+from typing import Optional, Union
 
 import pytz
 from langchain_core.runnables import RunnableConfig
 from langchain_core.tools import tool
 
-from db.db import db
+from db.cache import TTLCache
+from db.db import read_offset, to_present, to_stored
+from db.pool import get_pool, read_date_offset, read_table_versions
+from db.route_index import get_route_index
+from tools.utilities_tools import with_async_variant
 # from db.retriever import lookup_policy
 
-@tool
-def fetch_user_flight_information(config: RunnableConfig) -> list[dict]:
-    """Fetch all tickets for the user along with corresponding flight information and seat assignments.
+# 用户航班信息按 passenger_id 缓存；本进程改签/退票后立即失效，
+# 其他进程的写入通过共享的表版本号发现
+USER_INFO_TTL = 300
+USER_INFO_TABLES = ("ticket_flights", "flights")
+user_info_cache = TTLCache(maxsize=1024, ttl=USER_INFO_TTL)
+
+
+# 库中存的是锚定时刻的时间，返回给用户前加上查询时偏移；
+# 偏移每次调用从共享库读取，各进程始终一致
+FLIGHT_TIME_COLUMNS = ("scheduled_departure", "scheduled_arrival")
 
-    Returns:
-        A list of dictionaries where each dictionary contains the ticket details,
-        associated flight details, and the seat assignments for each ticket belonging to the user.
-    """
-    configuration = config.get("configurable", {})
-    passenger_id = configuration.get("passenger_id", None)
-    if not passenger_id:
-        raise ValueError("No passenger ID configured.")
 
-    with sqlite3.connect(db) as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
+def _present_flights(rows: list[dict], offset: timedelta) -> list[dict]:
+    for row in rows:
+        for column in FLIGHT_TIME_COLUMNS:
+            row[column] = to_present(row[column], offset)
+    return rows
+
+
+def _load_user_flight_information(passenger_id: str) -> list[dict]:
+    with get_pool().read() as conn:
+        offset = read_offset(conn)
+        rows = conn.execute("""
             SELECT 
                 t.ticket_no, t.book_ref,
                 f.flight_id, f.flight_no, f.departure_airport, f.arrival_airport,
@@ -37,18 +49,62 @@ def fetch_user_flight_information(config: RunnableConfig) -> list[dict]:
                 AND bp.flight_id = f.flight_id
             WHERE t.passenger_id = ?
             LIMIT 100  -- 防爆措施
-        """, (passenger_id,))
-        result = [
-            dict(zip(
-                [col[0] for col in cursor.description], 
-                row
-            ))
-            for row in cursor.fetchall()
-        ]
-        cursor.close()
-        return result
+        """, (passenger_id,)).fetchall()
+    return _present_flights(rows, offset)
 
 
+@with_async_variant
+@tool
+def fetch_user_flight_information(config: RunnableConfig) -> list[dict]:
+    """Fetch all tickets for the user along with corresponding flight information and seat assignments.
+
+    Returns:
+        A list of dictionaries where each dictionary contains the ticket details,
+        associated flight details, and the seat assignments for each ticket belonging to the user.
+    """
+    configuration = config.get("configurable", {})
+    passenger_id = configuration.get("passenger_id", None)
+    if not passenger_id:
+        raise ValueError("No passenger ID configured.")
+
+    versions = read_table_versions(USER_INFO_TABLES)
+    cached = user_info_cache.get(passenger_id)
+    if cached is not None and cached[0] == versions:
+        return list(cached[1])
+    result = _load_user_flight_information(passenger_id)
+    user_info_cache.set(passenger_id, (versions, result))
+    return list(result)
+
+
+# search_flights 单页最大行数
+MAX_FLIGHT_PAGE = 100
+
+
+def encode_cursor(scheduled_departure: str, flight_id: int) -> str:
+    """Opaque page token pointing just after the given flight."""
+    raw = json.dumps([scheduled_departure, flight_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> tuple[str, int]:
+    try:
+        scheduled_departure, flight_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return str(scheduled_departure), int(flight_id)
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+
+
+def _flight_page(rows: list[dict], limit: int, offset: timedelta) -> dict:
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        # 游标保存库中的原始键，与各进程的偏移无关
+        next_cursor = encode_cursor(rows[-1]["scheduled_departure"], rows[-1]["flight_id"])
+    # 游标放在行之前：上下文压缩从尾部截断工具输出，不能把它截掉
+    return {"next_cursor": next_cursor, "flights": _present_flights(rows, offset)}
+
+
+@with_async_variant
 @tool
 def search_flights(
     departure_airport: Union[str, None],
@@ -56,9 +112,25 @@ def search_flights(
     start_time: Union[date | datetime, None],
     end_time: Union[date | datetime, None],
     limit: int = 20,
-    offset: int = 0,
-) -> list[dict]:
-    """Search for flights based on departure airport, arrival airport, and departure time range."""
+    cursor: Optional[str] = None,
+) -> dict:
+    """Search for flights based on departure airport, arrival airport, and departure time range.
+
+    Results are ordered by scheduled departure. To get the next page, call again with the same
+    filters and `cursor` set to the returned "next_cursor"; it is null when there are no more flights.
+    """
+    limit = max(1, min(limit, MAX_FLIGHT_PAGE))
+    after = decode_cursor(cursor) if cursor else None
+    offset = read_date_offset()
+    start_time, end_time = to_stored(start_time, offset), to_stored(end_time, offset)
+
+    if departure_airport and arrival_airport:
+        # 航线 + 时间窗口是最常见的查询，直接走内存中的航线索引
+        rows = get_route_index().search(
+            departure_airport, arrival_airport, start_time, end_time, after, limit + 1
+        )
+        return _flight_page(rows, limit, offset)
+
     base_query = """
     SELECT 
         flight_id, flight_no, 
@@ -81,26 +153,23 @@ def search_flights(
         if value:
             base_query += f" AND {condition}"
             params.append(value)
-    
-    # 分页控制
-    base_query += " LIMIT ? OFFSET ?"
-    params.extend([limit, offset])
+
+    # 键集分页：从上一页最后一行之后继续，任意深度的翻页代价相同
+    if after:
+        base_query += " AND (scheduled_departure, flight_id) > (?, ?)"
+        params.extend(after)
+
+    # 多取一行用于判断是否还有下一页
+    base_query += " ORDER BY scheduled_departure, flight_id LIMIT ?"
+    params.append(limit + 1)
     
     # 执行查询
-    with sqlite3.connect(db) as conn:
-        cursor = conn.cursor()
-        cursor.execute(base_query, params)
-        result = [
-            dict(zip(
-                [col[0] for col in cursor.description], 
-                row
-            ))
-            for row in cursor.fetchall()
-        ]
-        cursor.close()
-        return result
+    with get_pool().read() as conn:
+        rows = conn.execute(base_query, params).fetchall()
+    return _flight_page(rows, limit, offset)
         
 
+@with_async_variant
 @tool(return_direct=True)
 def update_ticket_to_new_flight(
     ticket_no: str, 
@@ -114,45 +183,44 @@ def update_ticket_to_new_flight(
     if not (passenger_id := config.get("configurable", {}).get("passenger_id")):
         raise ValueError("Passenger ID required in config.configurable")
 
-    with sqlite3.connect(db) as conn:
-        cursor = conn.cursor()
+    # 校验与改签在同一个写事务内完成，避免并发改签之间的竞争
+    with get_pool().write() as conn:
         # 验证目标航班
-        cursor.execute(
+        new_flight = conn.execute(
             """SELECT departure_airport, arrival_airport, scheduled_departure 
             FROM flights WHERE flight_id = ?""",
             (new_flight_id,)
-        )
-        if not (new_flight := cursor.fetchone()):
+        ).fetchone()
+        if not new_flight:
             return "Invalid new flight ID"
             
         # 解析航班时间
-        dep_airport, arr_airport, dep_time_str = new_flight
-        dep_time = datetime.fromisoformat(dep_time_str)
+        dep_time = datetime.fromisoformat(
+            to_present(new_flight["scheduled_departure"], read_offset(conn))
+        )
         if (dep_time - datetime.now(pytz.utc)).total_seconds() < 10800:
-            cursor.close()
             return f"Cannot reschedule to flight departing in <3 hours ({dep_time})"
 
         # 验证机票所有权
-        cursor.execute(
+        owned = conn.execute(
             """SELECT 1 FROM tickets t
             JOIN ticket_flights tf ON t.ticket_no = tf.ticket_no
             WHERE t.ticket_no = ? AND t.passenger_id = ?""",
             (ticket_no, passenger_id)
-        )
-        if not cursor.fetchone():
-            cursor.close()
+        ).fetchone()
+        if not owned:
             return f"Passenger {passenger_id} does not own ticket {ticket_no}"
 
         # 执行改签
-        cursor.execute(
+        conn.execute(
             "UPDATE ticket_flights SET flight_id = ? WHERE ticket_no = ?",
             (new_flight_id, ticket_no))
-        conn.commit()
-        cursor.close()
             
+    user_info_cache.invalidate(passenger_id)
     return f"Successfully updated ticket {ticket_no} to flight {new_flight_id}"
 
 
+@with_async_variant
 @tool
 def cancel_ticket(ticket_no: str, *, config: RunnableConfig) -> str:
     """Cancel the user's ticket and remove it from the database."""
@@ -161,29 +229,24 @@ def cancel_ticket(ticket_no: str, *, config: RunnableConfig) -> str:
     if not passenger_id:
         raise ValueError("No passenger ID configured.")
     
-    with sqlite3.connect(db) as conn:
-        cursor = conn.cursor()
-
-        cursor.execute(
+    with get_pool().write() as conn:
+        existing = conn.execute(
             "SELECT flight_id FROM ticket_flights WHERE ticket_no = ?", (ticket_no,)
-        )
+        ).fetchone()
     
-        if not cursor.fetchone():
-            cursor.close()
+        if not existing:
             return "No existing ticket found for the given ticket number."
 
         # Check the signed-in user actually has this ticket
-        cursor.execute(
+        owned = conn.execute(
             "SELECT ticket_no FROM tickets WHERE ticket_no = ? AND passenger_id = ?",
             (ticket_no, passenger_id),
-        )
+        ).fetchone()
         
-        if not cursor.fetchone():
-            cursor.close()
+        if not owned:
             return f"Current signed-in passenger with ID {passenger_id} not the owner of ticket {ticket_no}"
 
-        cursor.execute("DELETE FROM ticket_flights WHERE ticket_no = ?", (ticket_no,))
-        conn.commit()
-        cursor.close()
+        conn.execute("DELETE FROM ticket_flights WHERE ticket_no = ?", (ticket_no,))
 
+    user_info_cache.invalidate(passenger_id)
     return "Ticket successfully cancelled."
\ No newline at end of file
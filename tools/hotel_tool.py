@@ -1,10 +1,21 @@
-import sqlite3
 from datetime import date, datetime
 from typing import Optional, Union
 from langchain_core.tools import tool
-from db.db import db
+from db.fts import text_search
+from db.pool import get_pool, update_returning
+from tools.shaping import availability_filter, search_table, with_row_limit
+from tools.utilities_tools import with_async_variant
 
 
+# 返回给 LLM 的列；未预订的排在前面
+HOTEL_COLUMNS = {
+    column: column
+    for column in ("id", "name", "location", "price_tier", "checkin_date", "checkout_date", "booked")
+}
+
+
+@with_async_variant
+@with_row_limit
 @tool
 def search_hotels(
     location: Optional[str] = None,
@@ -12,7 +23,7 @@ def search_hotels(
     price_tier: Optional[str] = None,
     checkin_date: Optional[Union[datetime, date]] = None,
     checkout_date: Optional[Union[datetime, date]] = None,
-) -> list[dict]:
+) -> dict:
     """
     Search for hotels based on location, name, price tier, check-in date, and check-out date.
 
@@ -24,34 +35,22 @@ def search_hotels(
         checkout_date (Optional[Union[datetime, date]]): The check-out date of the hotel. Defaults to None.
 
     Returns:
-        list[dict]: A list of hotel dictionaries matching the search criteria.
+        dict: Matching hotels as {"columns", "rows", "total", "truncated"}; unbooked hotels first,
+        at most {row_limit} rows. Narrow the search if "truncated" is true.
+        Entries already booked for dates overlapping the requested ones are left out.
     """
-    base_query = "SELECT * FROM hotels WHERE 1=1"
-    params = []
-
-    conditions = {
-        "location": (location, "location LIKE ?"),
-        "name": (name, "name LIKE ?"),
-    }
-    
-    for value, condition in conditions.values():
-        if value:
-            base_query += f" AND {condition}"
-            params.append(f"%{value}%")
-    
-    with sqlite3.connect(db) as conn:
-        cursor = conn.cursor()
-
-        # For the sake of this tutorial, we will let you match on any dates and price tier.
-        cursor.execute(base_query, params)
-        results = [
-            dict(zip([column[0] for column in cursor.description], row)) for row in cursor.fetchall()
-        ]
+    # 已被预订且时间段与所需日期重叠的记录不可用
+    where, params = availability_filter("checkin_date", "checkout_date", checkin_date, checkout_date)
+    if price_tier:
+        where.append("price_tier = ? COLLATE NOCASE")
+        params.append(price_tier.strip())
 
-        cursor.close()
-        return results
+    with get_pool().read() as conn:
+        text = text_search(conn, "hotels", {"location": [location], "name": [name]})
+        return search_table(conn, "hotels", HOTEL_COLUMNS, where, params, text=text)
 
 
+@with_async_variant
 @tool
 def book_hotel(hotel_id: int) -> str:
     """
@@ -63,20 +62,16 @@ def book_hotel(hotel_id: int) -> str:
     Returns:
         str: A message indicating whether the hotel was successfully booked or not.
     """
-    with sqlite3.connect(db) as conn:
-        cursor = conn.cursor()
+    with get_pool().write() as conn:
+        cursor = conn.execute("UPDATE hotels SET booked = 1 WHERE id = ?", (hotel_id,))
 
-        cursor.execute("UPDATE hotels SET booked = 1 WHERE id = ?", (hotel_id,))
-        conn.commit()
-
-        if cursor.rowcount > 0:
-            cursor.close()
-            return f"Hotel {hotel_id} successfully booked."
-        else:
-            cursor.close()
-            return f"No hotel found with ID {hotel_id}."
+    if cursor.rowcount > 0:
+        return f"Hotel {hotel_id} successfully booked."
+    else:
+        return f"No hotel found with ID {hotel_id}."
 
 
+@with_async_variant
 @tool
 def update_hotel(
     hotel_id: int,
@@ -94,29 +89,27 @@ def update_hotel(
     Returns:
         str: A message indicating whether the hotel was successfully updated or not.
     """
-    with sqlite3.connect(db) as conn:
-        cursor = conn.cursor()
-
-        if checkin_date:
-            cursor.execute(
-                "UPDATE hotels SET checkin_date = ? WHERE id = ?", (checkin_date, hotel_id)
-            )
-        if checkout_date:
-            cursor.execute(
-                "UPDATE hotels SET checkout_date = ? WHERE id = ?",
-                (checkout_date, hotel_id),
-            )
+    values = {
+        column: value
+        for column, value in (("checkin_date", checkin_date), ("checkout_date", checkout_date))
+        if value
+    }
+    if not values:
+        return f"No new dates given for hotel {hotel_id}; nothing was changed."
 
-        conn.commit()
+    # 一条 UPDATE 写入所有字段，并直接返回写入后的记录
+    with get_pool().write() as conn:
+        row = update_returning(conn, "hotels", hotel_id, values)
 
-        if cursor.rowcount > 0:
-            cursor.close()
-            return f"Hotel {hotel_id} successfully updated."
-        else:
-            cursor.close()
-            return f"No hotel found with ID {hotel_id}."
+    if row is None:
+        return f"No hotel found with ID {hotel_id}."
+    return (
+        f"Hotel {hotel_id} successfully updated. "
+        f"Check-in: {row['checkin_date']}, check-out: {row['checkout_date']}."
+    )
 
 
+@with_async_variant
 @tool
 def cancel_hotel(hotel_id: int) -> str:
     """
@@ -128,15 +121,10 @@ def cancel_hotel(hotel_id: int) -> str:
     Returns:
         str: A message indicating whether the hotel was successfully cancelled or not.
     """
-    with sqlite3.connect(db) as conn:
-        cursor = conn.cursor()
-
-        cursor.execute("UPDATE hotels SET booked = 0 WHERE id = ?", (hotel_id,))
-        conn.commit()
-
-        if cursor.rowcount > 0:
-            cursor.close()
-            return f"Hotel {hotel_id} successfully cancelled."
-        else:
-            cursor.close()
-            return f"No hotel found with ID {hotel_id}."
\ No newline at end of file
+    with get_pool().write() as conn:
+        cursor = conn.execute("UPDATE hotels SET booked = 0 WHERE id = ?", (hotel_id,))
+
+    if cursor.rowcount > 0:
+        return f"Hotel {hotel_id} successfully cancelled."
+    else:
+        return f"No hotel found with ID {hotel_id}."
\ No newline at end of file
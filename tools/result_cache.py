@@ -0,0 +1,170 @@
+import functools
+import json
+import os
+import threading
+from typing import Any, Callable, Optional
+
+from langchain_core.tools import BaseTool
+
+from db.cache import TTLCache
+from db.pool import read_table_versions
+
+
+# 只读工具 -> 其结果依赖的表
+READ_TOOL_TABLES: dict[str, tuple[str, ...]] = {
+    "search_flights": ("flights",),
+    "search_hotels": ("hotels",),
+    "search_car_rentals": ("car_rentals",),
+    "search_trip_recommendations": ("trip_recommendations",),
+    "lookup_policy": (),
+}
+
+# 写工具 -> 其修改的表，调用后这些表上的缓存结果全部失效
+WRITE_TOOL_TABLES: dict[str, tuple[str, ...]] = {
+    "update_ticket_to_new_flight": ("ticket_flights",),
+    "cancel_ticket": ("ticket_flights",),
+    "book_hotel": ("hotels",),
+    "update_hotel": ("hotels",),
+    "cancel_hotel": ("hotels",),
+    "book_car_rental": ("car_rentals",),
+    "update_car_rental": ("car_rentals",),
+    "cancel_car_rental": ("car_rentals",),
+    "book_excursion": ("trip_recommendations",),
+    "update_excursion": ("trip_recommendations",),
+    "cancel_excursion": ("trip_recommendations",),
+}
+
+TOOL_CACHE_TTL = float(os.environ.get("TOOL_CACHE_TTL", "60"))
+# 政策文档只随进程启动加载一次，可以缓存更久
+TOOL_CACHE_TTLS: dict[str, float] = {"lookup_policy": 3600}
+
+
+def _normalize_args(args: tuple, kwargs: dict) -> str:
+    def norm(value):
+        return value.strip() if isinstance(value, str) else value
+
+    normalized = {k: norm(v) for k, v in kwargs.items() if v is not None and k != "config"}
+    return json.dumps([[norm(a) for a in args], normalized], sort_keys=True, default=str)
+
+
+class ToolResultCache:
+    """Caches read-only tool results keyed by tool name and normalized args.
+
+    The cache key of a read tool includes the versions of the tables it
+    reads: the shared counters from `versions` (bumped by triggers on every
+    write, so writes from other workers count too) and a local generation
+    that write tools bump as soon as they return. Stale entries become
+    unreachable and age out of the LRU. A read that races a write stores
+    its result under the old versions and is never served.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 2048,
+        ttl: Optional[float] = TOOL_CACHE_TTL,
+        versions: Optional[Callable[[tuple[str, ...]], tuple]] = read_table_versions,
+    ):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._versions = versions
+        self._generations: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, name: str, args: tuple, kwargs: dict) -> tuple:
+        tables = READ_TOOL_TABLES[name]
+        with self._lock:
+            generations = tuple(self._generations.get(t, 0) for t in tables)
+        if tables and self._versions is not None:
+            generations += tuple(self._versions(tables))
+        return name, generations, _normalize_args(args, kwargs)
+
+    def invalidate_tables(self, tables: tuple[str, ...]) -> None:
+        with self._lock:
+            for table in tables:
+                self._generations[table] = self._generations.get(table, 0) + 1
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    def stats(self) -> dict:
+        return self._cache.stats()
+
+    def _lookup(self, key: tuple) -> tuple[bool, Any]:
+        value = self._cache.get(key, _MISS)
+        return value is not _MISS, value
+
+    def _store(self, key: tuple, value: Any) -> None:
+        self._cache.set(key, value, ttl=TOOL_CACHE_TTLS.get(key[0], TOOL_CACHE_TTL))
+
+    def _wrap_read(self, name: str, func, is_async: bool):
+        if is_async:
+
+            @functools.wraps(func)
+            async def cached(*args, **kwargs):
+                key = self._key(name, args, kwargs)
+                hit, value = self._lookup(key)
+                if not hit:
+                    value = await func(*args, **kwargs)
+                    self._store(key, value)
+                return value
+
+        else:
+
+            @functools.wraps(func)
+            def cached(*args, **kwargs):
+                key = self._key(name, args, kwargs)
+                hit, value = self._lookup(key)
+                if not hit:
+                    value = func(*args, **kwargs)
+                    self._store(key, value)
+                return value
+
+        return cached
+
+    def _wrap_write(self, tables: tuple[str, ...], func, is_async: bool):
+        if is_async:
+
+            @functools.wraps(func)
+            async def invalidating(*args, **kwargs):
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    self.invalidate_tables(tables)
+
+        else:
+
+            @functools.wraps(func)
+            def invalidating(*args, **kwargs):
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.invalidate_tables(tables)
+
+        return invalidating
+
+    def wrap(self, tool: BaseTool) -> BaseTool:
+        """Return a copy of `tool` that reads from / invalidates this cache.
+
+        Tools that are neither known reads nor known writes are returned as is.
+        """
+        name = tool.name
+        func = getattr(tool, "func", None)
+        coroutine = getattr(tool, "coroutine", None)
+        if name in READ_TOOL_TABLES:
+            wrap = functools.partial(self._wrap_read, name)
+        elif name in WRITE_TOOL_TABLES:
+            wrap = functools.partial(self._wrap_write, WRITE_TOOL_TABLES[name])
+        else:
+            return tool
+        if func is None and coroutine is None:
+            return tool
+        update = {}
+        if func is not None:
+            update["func"] = wrap(func, False)
+        if coroutine is not None:
+            update["coroutine"] = wrap(coroutine, True)
+        return tool.model_copy(update=update)
+
+
+_MISS = object()
+
+tool_result_cache = ToolResultCache()
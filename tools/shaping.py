@@ -0,0 +1,94 @@
+import os
+import sqlite3
+from datetime import date, datetime, timedelta
+from typing import Optional, Sequence, Union
+
+from db.fts import TextSearch
+
+
+# 搜索工具返回给 LLM 的最大行数
+SEARCH_ROW_LIMIT = int(os.environ.get("SEARCH_ROW_LIMIT", "20"))
+
+
+def with_row_limit(tool):
+    """Write the actual `SEARCH_ROW_LIMIT` into the `{row_limit}` marker of a tool's description."""
+    tool.description = tool.description.replace("{row_limit}", str(SEARCH_ROW_LIMIT))
+    return tool
+
+
+def to_date(value: Union[datetime, date, str]) -> date:
+    """The calendar day of a tool argument; hotel and car dates are day-granular."""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if isinstance(value, datetime):
+        value = value.date()
+    return value
+
+
+def availability_filter(
+    start_column: str,
+    end_column: str,
+    start: Optional[Union[datetime, date, str]],
+    end: Optional[Union[datetime, date, str]],
+) -> tuple[list[str], list]:
+    """Exclude rows already booked for a period overlapping [start, end).
+
+    Compares calendar days, whether a column holds '2024-04-09' or
+    '2024-04-09 00:00:00'. A missing bound leaves that side of the requested
+    period open.
+    """
+    if start is None and end is None:
+        return [], []
+    # 等价于 date(start_column) < end 且 date(end_column) > start，直接比较字符串：
+    # 以某天开头的字符串都 >= 该天本身，所以第二个条件写成 end_column >= start 的次日
+    clause = f"NOT (booked = 1 AND {start_column} < ? AND {end_column} >= ?)"
+    params = [
+        to_date(end).isoformat() if end is not None else "9999-12-31",
+        (to_date(start) + timedelta(days=1)).isoformat() if start is not None else "0000-01-01",
+    ]
+    return [clause], params
+
+
+def compact_table(rows: list[dict], columns: Sequence[str], total: int) -> dict:
+    """Serialize rows as a header plus value lists instead of one dict per row."""
+    return {
+        "columns": list(columns),
+        "rows": [[row[column] for column in columns] for row in rows],
+        "total": total,
+        "truncated": total > len(rows),
+    }
+
+
+def search_table(
+    conn: sqlite3.Connection,
+    table: str,
+    columns: dict[str, str],
+    where: Sequence[str] = (),
+    params: Sequence = (),
+    order_by: Optional[str] = None,
+    order_params: Sequence = (),
+    limit: int = SEARCH_ROW_LIMIT,
+    text: Optional[TextSearch] = None,
+) -> dict:
+    """Run a capped, ranked search and return it in `compact_table` form.
+
+    `columns` maps output names to SQL expressions, so callers can project
+    and trim (e.g. `substr(details, 1, 200)`) in one place. The total match
+    count comes from a window function in the same query. `text` adds the
+    full-text filters from `db.fts.text_search`; its bm25 rank is used after
+    availability when no `order_by` is given.
+    """
+    text = text or TextSearch()
+    if order_by is None:
+        order_by = "booked, _rank, id" if text.ranked else "booked, id"
+    where = [*where, *text.where]
+    select = ", ".join(f"{expr} AS {name}" for name, expr in columns.items())
+    query = f"SELECT {select}, COUNT(*) OVER () AS _total FROM {table}{text.join}"
+    if where:
+        query += " WHERE " + " AND ".join(where)
+    query += f" ORDER BY {order_by} LIMIT ?"
+    rows = conn.execute(
+        query, [*text.join_params, *params, *text.params, *order_params, limit]
+    ).fetchall()
+    total = rows[0]["_total"] if rows else 0
+    return compact_table(rows, list(columns), total)
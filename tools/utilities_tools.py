@@ -1,8 +1,42 @@
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
 from langchain_core.messages import ToolMessage
-from langchain_core.runnables import RunnableLambda
+from langchain_core.runnables import Runnable, RunnableLambda
+from langchain_core.runnables.config import run_in_executor
+from langchain_core.tools import StructuredTool
 
 from langgraph.prebuilt import ToolNode
 
+from tools.result_cache import ToolResultCache, tool_result_cache
+
+
+# 数据库类工具的异步版本在该有界线程池中执行，避免阻塞事件循环
+DB_EXECUTOR_MAX_WORKERS = int(os.environ.get("DB_EXECUTOR_MAX_WORKERS", "16"))
+db_executor = ThreadPoolExecutor(
+    max_workers=DB_EXECUTOR_MAX_WORKERS, thread_name_prefix="db-tool"
+)
+
+# 同一步内并行执行只读工具调用的最大线程数
+SAFE_TOOL_MAX_WORKERS = int(os.environ.get("SAFE_TOOL_MAX_WORKERS", "8"))
+
+
+def with_async_variant(tool: StructuredTool) -> StructuredTool:
+    """Give a sync tool a coroutine that runs its body on `db_executor`."""
+    func = tool.func
+
+    @functools.wraps(func)
+    async def coroutine(*args, **kwargs):
+        return await run_in_executor(db_executor, func, *args, **kwargs)
+
+    tool.coroutine = coroutine
+    return tool
+
+
+def format_tool_error(error: Exception) -> str:
+    return f"Error: {repr(error)}\n please fix your mistakes."
+
 
 def handle_tool_error(state) -> dict:
     error = state.get("error")
@@ -10,7 +44,7 @@ def handle_tool_error(state) -> dict:
     return {
         "messages": [
             ToolMessage(
-                content=f"Error: {repr(error)}\n please fix your mistakes.",
+                content=format_tool_error(error),
                 tool_call_id=tc["id"],
             )
             for tc in tool_calls
@@ -18,7 +52,30 @@ def handle_tool_error(state) -> dict:
     }
 
 
-def create_tool_node_with_fallback(tools: list) -> dict:
+def create_parallel_tool_node(
+    tools: list, cache: ToolResultCache | None = tool_result_cache
+) -> Runnable:
+    """Build the node for safe (read-only) tools.
+
+    ToolNode already runs one step's calls concurrently; `max_concurrency`
+    caps the threads used for sync calls, and errors are reported per call.
+    """
+    if cache is not None:
+        tools = [cache.wrap(t) for t in tools]
+    return ToolNode(tools, handle_tool_errors=format_tool_error).with_config(
+        max_concurrency=SAFE_TOOL_MAX_WORKERS
+    )
+
+
+def create_tool_node_with_fallback(
+    tools: list, cache: ToolResultCache | None = tool_result_cache
+) -> dict:
+    """Build a ToolNode whose read tools are served from `cache` when possible.
+
+    Pass `cache=None` to run every call against the database.
+    """
+    if cache is not None:
+        tools = [cache.wrap(t) for t in tools]
     return ToolNode(tools).with_fallbacks(
         [RunnableLambda(handle_tool_error)], exception_key="error"
     )